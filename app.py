@@ -1,81 +1,209 @@
-import os
-from flask import Flask, g
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
-from urllib.parse import urlparse
-from flask_migrate import Migrate
 import logging
+from urllib.parse import urlparse
+from flask import Flask, Blueprint, current_app, g, jsonify
+from flask_login import login_required
+from sqlalchemy.orm import scoped_session, sessionmaker
+from config import config_from_env
+from extensions import db, migrate, login_manager
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize SQLAlchemy
-db = SQLAlchemy()
-
-# Create the app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', os.urandom(24))
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = True  # Enable SQLAlchemy echo mode for debugging
-
-# Log the database URL (make sure to remove any sensitive information)
-parsed_url = urlparse(app.config['SQLALCHEMY_DATABASE_URI'])
-logger.info(f"Database URL: {parsed_url.scheme}://{parsed_url.hostname}:{parsed_url.port}{parsed_url.path}")
-
-# Initialize SQLAlchemy with the app
-db.init_app(app)
-
-# Initialize Flask-Migrate
-migrate = Migrate(app, db)
-
-# Setup LoginManager
-login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from user_cache import load_cached_user
+    return load_cached_user(int(user_id))
+
+ops = Blueprint('ops', __name__)
+
+@ops.route('/pool_stats')
+@login_required
+def db_pool_stats():
+    from db_pool import pool_stats
+    stats = pool_stats(db.engine)
+    replicas = current_app.extensions.get('replicas')
+    if replicas:
+        stats['replicas'] = {replica.name: pool_stats(replica.engine) for replica in replicas.replicas}
+    return jsonify(stats)
+
+@ops.route('/user_cache_stats')
+@login_required
+def user_cache_stats():
+    from user_cache import user_cache
+    return jsonify(user_cache.stats())
+
+@ops.route('/replica_stats')
+@login_required
+def replica_stats():
+    replicas = current_app.extensions.get('replicas')
+    return jsonify(replicas.stats() if replicas else {'replicas': 0})
+
+@ops.route('/fragment_cache_stats')
+@login_required
+def fragment_cache_stats():
+    from fragments import wallet_fragments
+    return jsonify(wallet_fragments.stats())
+
+@ops.route('/usage_stats')
+@login_required
+def usage_stats():
+    from usage import usage_tracker
+    return jsonify(usage_tracker.stats())
+
+@ops.route('/audit_stats')
+@login_required
+def audit_stats():
+    from audit import audit_log
+    return jsonify(audit_log.stats())
+
+@ops.route('/hash_stats')
+@login_required
+def password_hash_stats():
+    from hashing import password_hasher
+    return jsonify(password_hasher.stats())
 
 def get_db_session():
-    engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], pool_pre_ping=True, pool_recycle=3600)
-    db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    # Built once per app on top of Flask-SQLAlchemy's engine so both share the pool
+    db_session = current_app.extensions.get('g_db_session')
+    if db_session is None:
+        db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=db.engine))
+        current_app.extensions['g_db_session'] = db_session
     return db_session
 
-@app.before_request
 def before_request():
     g.db = get_db_session()
 
-@app.teardown_appcontext
 def shutdown_session(exception=None):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
-
-# Import models
-from models import User, APIKey, Category
-
-# Create tables
-with app.app_context():
-    try:
-        db.create_all()
-        logger.info("Database tables created successfully")
-    except SQLAlchemyError as e:
-        logger.error(f"Error creating database tables: {str(e)}")
-
-# Import and register blueprints
-from routes import main as main_blueprint
-app.register_blueprint(main_blueprint)
-
-from routes import auth as auth_blueprint
-app.register_blueprint(auth_blueprint)
+    db_session = g.pop('db', None)
+    if db_session is not None:
+        db_session.remove()
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Nothing here touches the database: the engine connects on first use and
+    the schema is managed by migrations (flask db upgrade, or flask init-db
+    for a fresh database).
+    """
+    from db_pool import engine_options, pool_stats
+    from hashing import password_hasher
+    from logging_setup import configure_logging, parse_sample_rates
+    from rate_limit import backend_from_url, decrypt_limiter, decrypt_slots
+
+    app = Flask(__name__)
+    app.config.from_mapping(config_from_env())
+    if config:
+        app.config.from_mapping(config)
+    # One pooled engine per process, shared by db.session and g.db
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    # Records are queued and written by a background thread
+    configure_logging(
+        app.config['LOG_LEVEL'],
+        sample_rates=parse_sample_rates(app.config['LOG_SAMPLE_RATES']),
+        queue_size=app.config['LOG_QUEUE_SIZE']
+    )
+    if app.config['SQL_ECHO']:
+        logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+
+    # Log the database URL (make sure to remove any sensitive information)
+    parsed_url = urlparse(app.config['SQLALCHEMY_DATABASE_URI'] or '')
+    logger.info("Database URL: %s://%s:%s%s", parsed_url.scheme, parsed_url.hostname, parsed_url.port, parsed_url.path)
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    # Read replicas for the read-only endpoints, if DATABASE_REPLICA_URLS is set
+    from replicas import init_replicas
+    replicas = init_replicas(app, engine_options)
+    login_manager.init_app(app)
+
+    password_hasher.configure(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE_LIMIT'], app.config['PASSWORD_HASH_METHOD'])
+    from backends import backend_from_url as shared_backend
+    from user_cache import user_cache, credential_versions
+    user_cache.max_entries = app.config['USER_CACHE_SIZE']
+    user_cache.ttl = app.config['USER_CACHE_TTL']
+    # A published version only has to outlive the cached copies made before it
+    credential_versions.configure(shared_backend(
+        app.config['USER_CACHE_URL'], 'USER_CACHE_URL', 'credentials:',
+        max_entries=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL']
+    ))
+    from fragments import wallet_fragments, backend_from_url as fragment_backend, template_salt
+    wallet_fragments.configure(
+        fragment_backend(
+            app.config['FRAGMENT_CACHE_URL'], app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+            app.config['FRAGMENT_CACHE_MAX_BYTES'], app.config['FRAGMENT_CACHE_TTL']
+        ),
+        enabled=app.config['FRAGMENT_CACHE_ENABLED'],
+        salt=template_salt(app, 'wallet_body.html')
+    )
+
+    decrypt_limiter.configure(
+        backend_from_url(app.config['RATE_LIMIT_STORAGE_URL']),
+        {
+            'user': (app.config['RATE_LIMIT_USER_RATE'], app.config['RATE_LIMIT_USER_BURST']),
+            'ip': (app.config['RATE_LIMIT_IP_RATE'], app.config['RATE_LIMIT_IP_BURST'])
+        },
+        enabled=app.config['RATE_LIMIT_ENABLED']
+    )
+    decrypt_slots.configure(app.config['DECRYPT_MAX_IN_FLIGHT'])
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    app.before_request(before_request)
+    app.teardown_appcontext(shutdown_session)
+
+    # Blueprints are imported here so importing this module stays cheap
+    from routes import main as main_blueprint, auth as auth_blueprint
+    app.register_blueprint(main_blueprint)
+    app.register_blueprint(auth_blueprint)
+    app.register_blueprint(ops)
+
+    # Fingerprinted static files from `flask assets build`
+    from assets import init_assets
+    init_assets(app)
+
+    # Per-request instrumentation, published at /metrics
+    from metrics import init_metrics, instrument_engine, gauge_sources
+    with app.app_context():
+        engine = db.engine
+    init_metrics(app, engine)
+    if replicas is not None:
+        for replica in replicas.replicas:
+            instrument_engine(replica.engine)
+        gauge_sources['replicas'] = replicas.stats
+    else:
+        gauge_sources.pop('replicas', None)
+    # Reveal usage and the audit trail are written behind through the primary engine
+    from usage import usage_tracker
+    usage_tracker.configure(
+        engine, interval=app.config['USAGE_FLUSH_INTERVAL'],
+        max_pending=app.config['USAGE_MAX_PENDING'], enabled=app.config['USAGE_TRACKING_ENABLED']
+    )
+    gauge_sources['usage'] = usage_tracker.stats
+    from audit import audit_log
+    audit_log.configure(
+        engine, batch_size=app.config['AUDIT_BATCH_SIZE'], flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+        queue_size=app.config['AUDIT_QUEUE_SIZE'], enabled=app.config['AUDIT_ENABLED']
+    )
+    gauge_sources['audit'] = audit_log.stats
+    gauge_sources['db_pool'] = lambda: pool_stats(engine)
+    gauge_sources['user_cache'] = user_cache.stats
+    gauge_sources['password_hash'] = password_hasher.stats
+    gauge_sources['wallet_fragments'] = wallet_fragments.stats
+    gauge_sources['rate_limit'] = decrypt_limiter.stats
+    gauge_sources['decrypt_slots'] = decrypt_slots.stats
+
+    # Register CLI commands (flask keys ..., flask assets build, flask audit partitions, flask init-db)
+    from cli import keys_cli, assets_cli, audit_cli, init_db_command
+    app.cli.add_command(keys_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(audit_cli)
+    app.cli.add_command(init_db_command)
+
+    return app
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
@@ -0,0 +1,4 @@
+from async_api import create_asgi_app
+
+# Async serving mode: uvicorn asgi:app --workers N
+app = create_asgi_app()
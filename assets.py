@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from flask import request, send_from_directory
+from flask.sessions import SecureCookieSessionInterface
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip variants are written
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Preferred first; each maps a Content-Encoding to its file suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CSS_STATIC_URL = re.compile(r"""url\((['"]?)/static/([^'")?#]+)\1\)""")
+
+def _fingerprinted_name(relative, content):
+    root, ext = os.path.splitext(relative)
+    return f'{DIST_DIR}/{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+def _write_compressed(path, content):
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        # Not worth serving a variant that saves almost nothing
+        if len(compressed) < len(content) * 0.9:
+            _write(path + suffix, compressed)
+
+def build_assets(static_folder):
+    """Write content-hashed copies of the static files, plus .gz/.br variants, to static/dist.
+
+    Returns the manifest mapping each original path (as passed to
+    url_for('static', filename=...)) to its hashed path; it is also saved
+    as static/dist/manifest.json, which init_assets reads at startup.
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames[:] = [name for name in dirnames if os.path.join(dirpath, name) != dist]
+        sources += [os.path.relpath(os.path.join(dirpath, name), static_folder).replace(os.sep, '/') for name in filenames]
+
+    manifest = {}
+    # Stylesheets go last so their url(/static/...) references can point at hashed names
+    for relative in sorted(sources, key=lambda path: (path.endswith('.css'), path)):
+        with open(os.path.join(static_folder, relative), 'rb') as f:
+            content = f.read()
+        if relative.endswith('.css'):
+            content = CSS_STATIC_URL.sub(
+                lambda match: f'url({match.group(1)}/static/{manifest.get(match.group(2), match.group(2))}{match.group(1)})',
+                content.decode()
+            ).encode()
+        hashed = _fingerprinted_name(relative, content)
+        path = os.path.join(static_folder, hashed)
+        _write(path, content)
+        if os.path.splitext(relative)[1] in COMPRESSIBLE:
+            _write_compressed(path, content)
+        manifest[relative] = hashed
+
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def send_fingerprinted(static_folder, filename, encodings):
+    """Serve a hashed file, precompressed if the client accepts it, cacheable forever."""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(static_folder, filename, max_age=IMMUTABLE_MAX_AGE)
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+class FingerprintedSessionInterface(SecureCookieSessionInterface):
+    """Leave the session alone on fingerprinted responses.
+
+    Flask-Login touches the session after every request, which would add
+    Vary: Cookie and keep shared caches from storing the files.
+    """
+
+    def save_session(self, app, session, response):
+        if request.endpoint == 'static' and response.cache_control.immutable:
+            return
+        super().save_session(app, session, response)
+
+def init_assets(app):
+    """Point url_for('static', ...) at the fingerprinted build and serve it with immutable caching.
+
+    Does nothing until `flask assets build` has produced a manifest, or
+    when STATIC_FINGERPRINTS is off; the plain files are then served as before.
+    """
+    manifest = load_manifest(app.static_folder) if app.config['STATIC_FINGERPRINTS'] else {}
+    if not manifest:
+        return
+    # Which precompressed variants exist, per hashed file; checked once here instead of per request
+    variants = {
+        hashed: {encoding for encoding, suffix in ENCODINGS if os.path.exists(os.path.join(app.static_folder, hashed + suffix))}
+        for hashed in manifest.values()
+    }
+
+    @app.url_defaults
+    def fingerprinted_static_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    default_static = app.view_functions['static']
+
+    def static(filename):
+        if filename not in variants:
+            return default_static(filename=filename)
+        return send_fingerprinted(app.static_folder, filename, variants[filename])
+
+    app.view_functions['static'] = static
+    app.session_interface = FingerprintedSessionInterface()
@@ -0,0 +1,366 @@
+import asyncio
+import hmac
+import logging
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from datetime import datetime, timezone
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadData, URLSafeTimedSerializer
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+from async_db import create_async_session_factory
+from audit import audit_log
+from metrics import request_seconds, response_bytes
+from models import User, APIKey, Category
+from rate_limit import decrypt_allowance, Throttled, retry_after_header
+from queries import first_pages_select, split_first_pages, group_keys_by_category, serialize_key, wallet_versions_select, wallet_stamp, SORTS
+from reveal import get_executor, reveal_select, decrypt_rows, DECRYPT_FAILED
+from user_cache import user_cache, auth_stamp, credential_versions
+from utils import encrypt_key
+
+logger = logging.getLogger(__name__)
+
+def read_flask_session(flask_app, request):
+    """Decode Flask's signed session cookie; an unreadable cookie is an empty session."""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadData:
+        return {}
+
+async def authenticated_user_id(request):
+    """Return the session's user id if it can be trusted without Flask, else None.
+
+    Mirrors load_cached_user: the session's auth stamp must match the
+    user's current credentials version. Sessions without a stamp are left
+    to Flask, which fills it in.
+    """
+    state = request.app.state
+    session = read_flask_session(state.flask_app, request)
+    request.state.flask_session = session
+    user_id, stamp = session.get('_user_id'), session.get('_auth_stamp')
+    if user_id is None or stamp is None:
+        return None
+    user_id = int(user_id)
+    user = user_cache.get(user_id)
+    if user is None or not credential_versions.is_current(user):
+        async with state.sessions() as db_session:
+            user = await db_session.get(User, user_id)
+            if user is None:
+                return None
+            db_session.expunge(user)
+        user_cache.set(user_id, user)
+    return user_id if auth_stamp(user) == stamp else None
+
+def stick_to_primary(request, response):
+    """Open the read-your-writes window replicas._mark_sticky opens for WSGI writes.
+
+    Writes here go to the primary, but the user's next reads may be served
+    by Flask from a replica, so the session cookie is re-signed with
+    _primary_until the same way Flask would.
+    """
+    flask_app = request.app.state.flask_app
+    replicas = flask_app.extensions.get('replicas')
+    if replicas is None:
+        return
+    session = dict(request.state.flask_session)
+    session['_primary_until'] = time.time() + replicas.sticky_seconds
+    interface = flask_app.session_interface
+    samesite = interface.get_cookie_samesite(flask_app)
+    response.set_cookie(
+        interface.get_cookie_name(flask_app),
+        interface.get_signing_serializer(flask_app).dumps(session),
+        expires=datetime.now(timezone.utc) + flask_app.permanent_session_lifetime if session.get('_permanent') else None,
+        path=interface.get_cookie_path(flask_app),
+        domain=interface.get_cookie_domain(flask_app),
+        secure=interface.get_cookie_secure(flask_app),
+        httponly=interface.get_cookie_httponly(flask_app),
+        samesite=samesite.lower() if samesite else None
+    )
+
+async def run_crypto(request, func, *args):
+    # Fernet is CPU-bound; keep it on the shared reveal pool so the event loop stays free
+    executor = get_executor(request.app.state.flask_app.config['REVEAL_WORKERS'])
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+class WalletEndpoint:
+    """ASGI endpoint that serves an authenticated JSON call natively.
+
+    Anything it cannot vouch for (anonymous, stale or stamp-less sessions)
+    is passed untouched to the Flask app, so redirects and session
+    upkeep behave exactly as under WSGI.
+    """
+
+    def __init__(self, name, handler, writes=False):
+        self.name = name
+        self.handler = handler
+        self.writes = writes
+
+    async def __call__(self, scope, receive, send):
+        start = time.perf_counter()
+        request = Request(scope, receive)
+        if await authenticated_user_id(request) is None:
+            await request.app.state.wsgi(scope, receive, send)
+            return
+        user_id = int(request.state.flask_session['_user_id'])
+        response = await self.handler(request, user_id)
+        if self.writes and response.status_code < 400:
+            stick_to_primary(request, response)
+        await response(scope, receive, send)
+        request_seconds.observe((self.name,), time.perf_counter() - start)
+        response_bytes.observe((self.name,), len(response.body))
+
+async def reveal_single_key(request, user_id, route_name, not_found_status):
+    # The same allowance as throttle_decrypts on the WSGI routes
+    try:
+        with decrypt_allowance(user_id, client_ip(request)):
+            return await reveal_owned_key(request, user_id, route_name, not_found_status)
+    except Throttled as e:
+        return JSONResponse({'error': e.message}, status_code=e.status, headers={'Retry-After': retry_after_header(e.retry_after)})
+
+async def reveal_owned_key(request, user_id, route_name, not_found_status):
+    key_id = request.path_params['key_id']
+    try:
+        async with request.app.state.sessions() as session:
+            rows = (await session.execute(reveal_select(user_id, key_ids=[key_id]))).all()
+        # One row decrypts inline, so this does not queue a second task on the reveal pool
+        revealed, errors = await run_crypto(request, partial(decrypt_rows, user_id, rows, key_ids=[key_id], ip=client_ip(request)))
+        if key_id in revealed:
+            return JSONResponse({'key': revealed[key_id]})
+        if errors.get(key_id) == DECRYPT_FAILED:
+            return JSONResponse({'error': 'An error occurred while processing the request'}, status_code=500)
+        logger.warning("API key not found or unauthorized for key_id: %s", key_id)
+        return JSONResponse({'error': 'API Key not found or unauthorized.'}, status_code=not_found_status)
+    except Exception as e:
+        logger.error('Error in %s route: %s', route_name, e, exc_info=True)
+        return JSONResponse({'error': 'An error occurred while processing the request'}, status_code=500)
+
+async def copy_key(request, user_id):
+    return await reveal_single_key(request, user_id, 'copy_key', not_found_status=403)
+
+async def get_key(request, user_id):
+    return await reveal_single_key(request, user_id, 'get_key', not_found_status=404)
+
+async def get_categories_and_keys(request, user_id):
+    config = request.app.state.flask_app.config
+    try:
+        default = config.get('WALLET_PAGE_SIZE', 50)
+        page_size = int(request.query_params.get('page_size', default))
+    except ValueError:
+        page_size = default
+    page_size = max(1, min(page_size, config.get('WALLET_MAX_PAGE_SIZE', 200)))
+    sort = request.query_params.get('sort', 'name')
+    if sort not in SORTS:
+        sort = 'name'
+    cache_headers = {'Cache-Control': 'private, no-cache'}
+    try:
+        async with request.app.state.sessions() as session:
+            stamp = wallet_stamp((await session.execute(wallet_versions_select(user_id))).first(), sort)
+            etag = f'wallet-{user_id}-{stamp}-{page_size}-{sort}'
+            cache_headers['ETag'] = f'"{etag}"'
+            if etag in parse_etags(request.headers.get('if-none-match')):
+                return Response(status_code=304, headers=cache_headers)
+
+            categories = (await session.scalars(select(Category).where(Category.user_id == user_id).order_by(Category.name))).all()
+            rows = (await session.scalars(first_pages_select(user_id, page_size, sort=sort))).all()
+        api_keys, next_cursors = split_first_pages(rows, page_size, sort)
+        grouped_keys = group_keys_by_category(api_keys, categories, serialize=lambda key: serialize_key(key, sort))
+        return JSONResponse({
+            'categories': [{'id': c.id, 'name': c.name} for c in categories],
+            'grouped_keys': grouped_keys,
+            'next_cursors': next_cursors
+        }, headers=cache_headers)
+    except Exception as e:
+        logger.error("Error in get_categories_and_keys route: %s", e)
+        return JSONResponse({'error': 'An error occurred while fetching categories and keys.'}, status_code=500)
+
+def csrf_errors(config, session, token):
+    # Same token format and checks as Flask-WTF's FlaskForm
+    if not config.get('WTF_CSRF_ENABLED', True):
+        return None
+    if not token or 'csrf_token' not in session:
+        return ['The CSRF token is missing.']
+    serializer = URLSafeTimedSerializer(config.get('WTF_CSRF_SECRET_KEY') or config['SECRET_KEY'], salt='wtf-csrf-token')
+    try:
+        value = serializer.loads(token, max_age=config.get('WTF_CSRF_TIME_LIMIT', 3600))
+    except BadData:
+        return ['The CSRF token is invalid.']
+    if not hmac.compare_digest(session['csrf_token'], value):
+        return ['The CSRF tokens do not match.']
+    return None
+
+async def add_key(request, user_id):
+    form = await request.form()
+    errors = {}
+    key_name = form.get('key_name') or ''
+    api_key = form.get('api_key') or ''
+    if not key_name.strip():
+        errors['key_name'] = ['This field is required.']
+    elif len(key_name) > 120:
+        errors['key_name'] = ['Field cannot be longer than 120 characters.']
+    if not api_key.strip():
+        errors['api_key'] = ['This field is required.']
+    try:
+        category_id = int(form.get('category') or 0)
+    except ValueError:
+        errors['category'] = ['Invalid Choice: could not coerce.']
+        category_id = 0
+    csrf = csrf_errors(request.app.state.flask_app.config, request.state.flask_session, form.get('csrf_token'))
+    if csrf:
+        errors['csrf_token'] = csrf
+
+    try:
+        async with request.app.state.sessions() as session:
+            category = None
+            if category_id and not errors:
+                category = await session.scalar(select(Category).where(Category.id == category_id, Category.user_id == user_id))
+                if category is None:
+                    errors['category'] = ['Not a valid choice.']
+            if errors:
+                return JSONResponse({'success': False, 'errors': errors}, status_code=400)
+
+            new_key = APIKey(
+                user_id=user_id,
+                key_name=key_name,
+                ciphertext=await run_crypto(request, encrypt_key, api_key),
+                category_id=category.id if category else None
+            )
+            session.add(new_key)
+            await session.execute(User.wallet_version_increment(user_id))
+            await session.commit()
+            audit_log.record('add', user_id, [new_key.id], ip=client_ip(request))
+            return JSONResponse({
+                'success': True,
+                'message': 'API Key added successfully.',
+                'key': {
+                    'id': new_key.id,
+                    'key_name': new_key.key_name,
+                    'category_id': new_key.category_id,
+                    'category_name': category.name if category else 'Uncategorized'
+                }
+            })
+    except SQLAlchemyError as e:
+        logger.error("Database error in add_key route: %s", e)
+        return JSONResponse({'success': False, 'error': 'An error occurred while adding the API key. Please try again.'}, status_code=500)
+    except Exception as e:
+        logger.error("Unexpected error in add_key route: %s", e)
+        return JSONResponse({'success': False, 'error': 'An unexpected error occurred. Please try again.'}, status_code=500)
+
+def client_ip(request):
+    return request.client.host if request.client else None
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def owned_key(session, key_id, user_id):
+    return await session.scalar(select(APIKey).where(APIKey.id == key_id, APIKey.user_id == user_id))
+
+async def delete_key(request, user_id):
+    try:
+        async with request.app.state.sessions() as session:
+            api_key = await owned_key(session, request.path_params['key_id'], user_id)
+            if api_key is None:
+                return JSONResponse({'success': False, 'error': 'API Key not found or unauthorized.'}, status_code=404)
+            await session.delete(api_key)
+            await session.execute(User.wallet_version_increment(user_id))
+            await session.commit()
+            audit_log.record('delete', user_id, [api_key.id], ip=client_ip(request))
+            return JSONResponse({'success': True, 'message': 'API Key deleted successfully.'})
+    except SQLAlchemyError as e:
+        logger.error('Database error in delete_key route: %s', e)
+        return JSONResponse({'success': False, 'error': 'An error occurred while deleting the API key.'}, status_code=500)
+
+async def edit_key(request, user_id):
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({'success': False, 'error': 'A JSON body is required.'}, status_code=400)
+    try:
+        async with request.app.state.sessions() as session:
+            api_key = await owned_key(session, request.path_params['key_id'], user_id)
+            if api_key is None:
+                return JSONResponse({'success': False, 'error': 'API Key not found or unauthorized.'}, status_code=404)
+            new_name = data.get('key_name')
+            if not new_name:
+                return JSONResponse({'success': False, 'error': 'New key name is required.'}, status_code=400)
+            api_key.key_name = new_name
+            await session.execute(User.wallet_version_increment(user_id))
+            await session.commit()
+            audit_log.record('edit', user_id, [api_key.id], ip=client_ip(request))
+            return JSONResponse({'success': True, 'message': 'API Key name updated successfully.', 'new_name': new_name})
+    except SQLAlchemyError as e:
+        logger.error('Database error in edit_key route: %s', e)
+        return JSONResponse({'success': False, 'error': 'An error occurred while updating the API key name.'}, status_code=500)
+
+async def update_key_category(request, user_id):
+    data = await read_json(request)
+    if data is None:
+        return JSONResponse({'success': False, 'error': 'A JSON body is required.'}, status_code=400)
+    category_id = data.get('category_id')
+    try:
+        async with request.app.state.sessions() as session:
+            api_key = await owned_key(session, request.path_params['key_id'], user_id)
+            if api_key is None:
+                return JSONResponse({'success': False, 'error': 'API Key not found or unauthorized.'}, status_code=404)
+            if category_id == 0:
+                api_key.category_id = None
+                category_name = 'Uncategorized'
+            else:
+                category = await session.scalar(select(Category).where(Category.id == category_id, Category.user_id == user_id))
+                if category is None:
+                    return JSONResponse({'success': False, 'error': 'Category not found.'}, status_code=404)
+                api_key.category_id = category.id
+                category_name = category.name
+            await session.execute(User.wallet_version_increment(user_id))
+            await session.commit()
+            audit_log.record('edit', user_id, [api_key.id], ip=client_ip(request))
+            return JSONResponse({'success': True, 'message': 'Category updated successfully.', 'category_name': category_name})
+    except SQLAlchemyError as e:
+        logger.error('Database error in update_key_category route: %s', e)
+        return JSONResponse({'success': False, 'error': 'An error occurred while updating the category.'}, status_code=500)
+
+def create_asgi_app(flask_app=None):
+    """Serve the JSON API natively on asyncio and mount the Flask app for everything else.
+
+    Uses the same models, queries and crypto helpers as the WSGI routes,
+    through an AsyncSession on asyncpg (aiosqlite for SQLite).
+    """
+    if flask_app is None:
+        from app import create_app
+        flask_app = create_app()
+    engine, sessions = create_async_session_factory(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+    wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_WORKERS'])
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    routes = [
+        Route('/copy_key/{key_id:int}', WalletEndpoint('async.copy_key', copy_key), methods=['POST']),
+        Route('/get_key/{key_id:int}', WalletEndpoint('async.get_key', get_key), methods=['POST']),
+        Route('/get_categories_and_keys', WalletEndpoint('async.get_categories_and_keys', get_categories_and_keys), methods=['GET']),
+        Route('/add_key', WalletEndpoint('async.add_key', add_key, writes=True), methods=['POST']),
+        Route('/delete_key/{key_id:int}', WalletEndpoint('async.delete_key', delete_key, writes=True), methods=['POST']),
+        Route('/edit_key/{key_id:int}', WalletEndpoint('async.edit_key', edit_key, writes=True), methods=['POST']),
+        Route('/update_key_category/{key_id:int}', WalletEndpoint('async.update_key_category', update_key_category, writes=True), methods=['POST']),
+        Mount('/', app=wsgi),
+    ]
+    app = Starlette(routes=routes, lifespan=lifespan)
+    app.state.flask_app = flask_app
+    app.state.engine = engine
+    app.state.sessions = sessions
+    app.state.wsgi = wsgi
+    return app
@@ -0,0 +1,32 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from db_pool import engine_options
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_database_url(database_uri):
+    """Translate the sync DATABASE_URL into its asyncpg/aiosqlite equivalent."""
+    url = make_url(database_uri)
+    driver = ASYNC_DRIVERS.get(url.drivername)
+    if driver is None:
+        raise ValueError(f"No async driver configured for {url.drivername!r}")
+    url = url.set(drivername=driver)
+    # asyncpg takes ssl=..., not libpq's sslmode=...
+    if driver == 'postgresql+asyncpg' and 'sslmode' in url.query:
+        query = dict(url.query)
+        query['ssl'] = query.pop('sslmode')
+        url = url.set(query=query)
+    return url
+
+def create_async_session_factory(database_uri):
+    """Return (engine, sessionmaker) for the async API, sized by the same DB_POOL_* settings."""
+    options = engine_options(database_uri)
+    # The async engine brings its own asyncio-aware queue pool
+    options.pop('poolclass', None)
+    engine = create_async_engine(async_database_url(database_uri), **options)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
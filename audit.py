@@ -0,0 +1,239 @@
+import base64
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import insert, select, text, tuple_
+from background import BackgroundThread
+from models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ('reveal', 'add', 'edit', 'delete', 'export')
+
+class AuditWriter:
+    """Append-only audit trail written in batches by a background thread.
+
+    record() only enqueues, so requests never wait on the audit table. The
+    writer drains the queue into multi-row INSERTs of up to batch_size
+    events, at least every flush_interval seconds. The queue is bounded;
+    when it is full new events are dropped, counted and logged rather than
+    blocking the request. A failed batch is retried with the next one, and
+    everything still queued is written at exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._retry = []
+        self._writer = BackgroundThread(self._run, 'audit-writer')
+        self.engine = None
+        self.enabled = False
+        self.batch_size = 500
+        self.flush_interval = 1.0
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def configure(self, engine, batch_size=500, flush_interval=1.0, queue_size=100000, enabled=True):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        if self._queue.maxsize != queue_size:
+            self._queue = queue.Queue(maxsize=queue_size)
+        if enabled:
+            self._writer.at_exit(self.shutdown)
+
+    def record(self, action, user_id, key_ids=None, ip=None):
+        """Queue one event per key id (a single keyless event if key_ids is None)."""
+        if not self.enabled:
+            return
+        self._writer.start()
+        if ip is None and has_request_context():
+            ip = request.remote_addr
+        now = datetime.utcnow()
+        events = key_ids if key_ids is not None else [None]
+        dropped = 0
+        for key_id in events:
+            try:
+                self._queue.put_nowait({'occurred_at': now, 'user_id': user_id, 'key_id': key_id, 'action': action, 'ip': ip})
+            except queue.Full:
+                dropped += 1
+        with self._lock:
+            self.recorded += len(events)
+            if dropped:
+                if not self.dropped:
+                    logger.warning("Audit queue is full; dropping events until the writer catches up")
+                self.dropped += dropped
+
+    def _take_batch(self, wait):
+        # Collect until the batch is full or wait seconds have passed
+        with self._lock:
+            batch, self._retry = self._retry, []
+        deadline = time.monotonic() + wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(AuditEvent.__table__).values(batch))
+        except Exception as e:
+            logger.error("Writing %s audit events failed; retrying with the next batch: %s", len(batch), e)
+            with self._lock:
+                self.errors += 1
+                self._retry = batch + self._retry
+            return False
+        with self._lock:
+            self.batches += 1
+            self.written += len(batch)
+        return True
+
+    def _run(self):
+        while not self._writer.stopping.is_set():
+            batch = self._take_batch(self.flush_interval)
+            if batch and not self._write(batch):
+                self._writer.stopping.wait(self.flush_interval)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while True:
+            batch = self._take_batch(0)
+            if not batch or not self._write(batch):
+                return
+
+    def shutdown(self):
+        # Let the writer finish the batch it is holding before draining the rest
+        self._writer.stop(self.flush_interval + 5)
+        if self.engine is not None:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'queued': self._queue.qsize(),
+                'max_queued': self._queue.maxsize,
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'errors': self.errors
+            }
+
+audit_log = AuditWriter()
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(event):
+    return base64.urlsafe_b64encode(json.dumps([event.occurred_at.isoformat(), event.id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        occurred_at, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(occurred_at), int(event_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+def history_select(user_id, key_id=None, cursor=None, limit=100):
+    """Newest-first events for a user, optionally one key, after a cursor.
+
+    Served by the (user_id, occurred_at, id) and (key_id, occurred_at, id)
+    indexes; on Postgres each partition has its own copy.
+    """
+    statement = select(AuditEvent.__table__).where(AuditEvent.user_id == user_id)
+    if key_id is not None:
+        statement = statement.where(AuditEvent.key_id == key_id)
+    if cursor:
+        statement = statement.where(tuple_(AuditEvent.occurred_at, AuditEvent.id) < tuple_(*decode_cursor(cursor)))
+    return statement.order_by(AuditEvent.occurred_at.desc(), AuditEvent.id.desc()).limit(limit)
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'occurred_at': event.occurred_at.isoformat(),
+        'action': event.action,
+        'key_id': event.key_id,
+        'ip': event.ip
+    }
+
+def month_start(moment, offset=0):
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+def partition_name(start):
+    return f'audit_event_{start:%Y_%m}'
+
+def _create_partition(connection, name, start, end):
+    bounds = {'start': start, 'end': end}
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF audit_event "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    )
+    stranded = connection.execute(text(
+        'SELECT EXISTS (SELECT 1 FROM audit_event_default WHERE occurred_at >= :start AND occurred_at < :end)'
+    ), bounds).scalar()
+    if not stranded:
+        connection.execute(create)
+        return
+    # Postgres refuses a partition over rows already in the default one, so move them across
+    # with the default detached; the lock this takes holds off audit writes until commit
+    connection.execute(text('ALTER TABLE audit_event DETACH PARTITION audit_event_default'))
+    connection.execute(create)
+    moved = connection.execute(text(
+        f'INSERT INTO {name} SELECT * FROM audit_event_default WHERE occurred_at >= :start AND occurred_at < :end'
+    ), bounds).rowcount
+    connection.execute(text('DELETE FROM audit_event_default WHERE occurred_at >= :start AND occurred_at < :end'), bounds)
+    connection.execute(text('ALTER TABLE audit_event ATTACH PARTITION audit_event_default DEFAULT'))
+    logger.info("Moved %s audit events from audit_event_default into %s", moved, name)
+
+def ensure_partitions(connection, months_ahead=3, now=None):
+    """Create monthly audit_event partitions from this month through months_ahead (Postgres only).
+
+    Events for a month without a partition land in audit_event_default;
+    they are moved into the month's partition when it is created. Each
+    month runs in its own savepoint, so one failing does not stop the
+    rest. Returns the partitions created.
+    """
+    now = now or datetime.utcnow()
+    created = []
+    for offset in range(months_ahead + 1):
+        start = month_start(now, offset)
+        name = partition_name(start)
+        exists = connection.execute(text('SELECT to_regclass(:name)'), {'name': name}).scalar()
+        if exists is not None:
+            continue
+        try:
+            with connection.begin_nested():
+                _create_partition(connection, name, start, month_start(start, 1))
+        except Exception as e:
+            logger.error("Creating audit partition %s failed: %s", name, e)
+            continue
+        created.append(name)
+    return created
+
+def drop_partitions_before(connection, cutoff):
+    """Drop monthly partitions that end on or before cutoff's month (Postgres only); returns their names."""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'audit_event' AND child.relname LIKE 'audit\\_event\\_____\\___' ORDER BY child.relname"
+    )).scalars().all()
+    dropped = [name for name in names if name < partition_name(month_start(cutoff))]
+    for name in dropped:
+        connection.execute(text(f'ALTER TABLE audit_event DETACH PARTITION {name}'))
+        connection.execute(text(f'DROP TABLE {name}'))
+    return dropped
@@ -0,0 +1,101 @@
+import threading
+import time
+from cache import TTLCache
+
+# Same algorithm as MemoryBackend.take, atomic in Redis and timed by the Redis clock
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens, updated = tonumber(state[1]) or burst, tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(retry_after)
+"""
+
+class MemoryBackend:
+    """Shared state in this process's memory; each worker process keeps its own.
+
+    An LRU capped by entry count (and total bytes when max_bytes is set),
+    whose entries also expire after ttl seconds. Used as a string store by
+    the fragment cache and as token buckets by the rate limiter.
+    """
+
+    def __init__(self, max_entries=100000, ttl=3600, max_bytes=None, sizeof=None):
+        self._cache = TTLCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, sizeof=sizeof)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def take(self, key, rate, burst, cost=1):
+        """Spend cost tokens from key's bucket; return 0 if allowed, else seconds until it would be.
+
+        A bucket dropped by the LRU or TTL starts full again, as it would
+        have after being idle.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._cache.get(key) or (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / rate
+            self._cache.set(key, (tokens, now))
+        return retry_after
+
+    def stats(self):
+        stats = self._cache.stats()
+        result = {'entries': stats['entries'], 'evictions': stats['evictions']}
+        if 'bytes' in stats:
+            result.update({'bytes': stats['bytes'], 'max_bytes': stats['max_bytes']})
+        return result
+
+class RedisBackend:
+    """Shared state for every process through Redis (needs the redis package); Redis enforces its own memory cap."""
+
+    def __init__(self, url, prefix, ttl=3600):
+        import redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self._script = None
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        self._client.set(self.prefix + key, value.encode(), ex=int(self.ttl))
+
+    def take(self, key, rate, burst, cost=1):
+        if self._script is None:
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        return float(self._script(keys=[self.prefix + key], args=[rate, burst, cost]))
+
+    def stats(self):
+        return {}
+
+def backend_from_url(url, setting, prefix, **memory_options):
+    """memory:// (or nothing) for a MemoryBackend built from memory_options, redis://... for Redis.
+
+    setting names the config key in errors; prefix namespaces the Redis keys.
+    """
+    if not url or url.startswith('memory://'):
+        return MemoryBackend(**memory_options)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url, prefix, ttl=memory_options.get('ttl', 3600))
+    raise ValueError(f"Unsupported {setting}: {url!r}")
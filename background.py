@@ -0,0 +1,48 @@
+import atexit
+import os
+import threading
+
+class BackgroundThread:
+    """A daemon thread running target, started lazily once per process.
+
+    Used by the write-behind buffers (usage.usage_tracker, audit.audit_log):
+    they call start() on their first event, wait on stopping between
+    flushes, and register their shutdown with at_exit() so whatever is
+    still buffered gets written.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self.stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    def at_exit(self, shutdown):
+        if not self._atexit_registered:
+            atexit.register(shutdown)
+            self._atexit_registered = True
+
+    def start(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def stop(self, timeout=None):
+        """Ask the thread to stop and wait up to timeout seconds for it in this process.
+
+        Once it has exited, the next start() runs a fresh one.
+        """
+        self.stopping.set()
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._thread.join(timeout)
+                if not self._thread.is_alive():
+                    self._pid = None
+                    self.stopping.clear()
@@ -0,0 +1,117 @@
+import base64
+import io
+import json
+import os
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from audit import audit_log
+from extensions import db
+from bulk_import import import_keys
+from models import APIKey, Category
+from utils import decrypt_key
+
+BACKUP_FORMAT = 'keyguardian-backup'
+BACKUP_VERSION = 1
+CHECK_PLAINTEXT = b'keyguardian-backup-check'
+MIN_PASSPHRASE_LENGTH = 8
+
+class BackupError(ValueError):
+    pass
+
+def derive_fernet(passphrase, salt):
+    kdf = Scrypt(salt=salt, length=32, n=2 ** 15, r=8, p=1)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(passphrase.encode())))
+
+def check_passphrase(passphrase):
+    if not passphrase or len(passphrase) < MIN_PASSPHRASE_LENGTH:
+        raise BackupError(f'The backup passphrase must be at least {MIN_PASSPHRASE_LENGTH} characters.')
+
+def export_lines(user_id, passphrase, chunk_size=500):
+    """Yield a user's backup archive as JSON Lines, one chunk of rows at a time.
+
+    The first line is a header carrying the scrypt salt; every following line
+    is a Fernet token of one key record, re-encrypted under the passphrase.
+    Keys are read through a server-side cursor, so memory does not grow with
+    the size of the wallet.
+    """
+    check_passphrase(passphrase)
+    salt = os.urandom(16)
+    backup_fernet = derive_fernet(passphrase, salt)
+    yield json.dumps({
+        'format': BACKUP_FORMAT,
+        'version': BACKUP_VERSION,
+        'kdf': 'scrypt',
+        'salt': base64.b64encode(salt).decode(),
+        'check': backup_fernet.encrypt(CHECK_PLAINTEXT).decode()
+    }) + '\n'
+
+    audit_log.record('export', user_id)
+    rows = db.session.query(APIKey.key_name, APIKey.ciphertext, APIKey.encrypted_key, Category.name, APIKey.date_added) \
+        .outerjoin(Category, APIKey.category_id == Category.id) \
+        .filter(APIKey.user_id == user_id) \
+        .order_by(APIKey.id) \
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    chunk = []
+    for key_name, ciphertext, encrypted_key, category_name, date_added in rows:
+        record = {
+            'key_name': key_name,
+            'api_key': decrypt_key(ciphertext or encrypted_key),
+            'category': category_name or '',
+            'date_added': date_added.isoformat() if date_added else None
+        }
+        chunk.append(backup_fernet.encrypt(json.dumps(record).encode()).decode())
+        if len(chunk) >= chunk_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+def read_backup(text_stream, passphrase):
+    """Yield (line_number, row) pairs from a backup archive for bulk_import.
+
+    Records that fail to decrypt are yielded as (line_number, error_message).
+    """
+    check_passphrase(passphrase)
+    try:
+        header = json.loads(text_stream.readline())
+    except ValueError:
+        raise BackupError('The file is not a KeyGuardian backup.')
+    if not isinstance(header, dict) or header.get('format') != BACKUP_FORMAT:
+        raise BackupError('The file is not a KeyGuardian backup.')
+    if header.get('version') != BACKUP_VERSION:
+        raise BackupError(f"Unsupported backup version: {header.get('version')}")
+    if header.get('kdf') != 'scrypt':
+        raise BackupError(f"Unsupported backup key derivation: {header.get('kdf')}")
+    salt, check = header.get('salt'), header.get('check')
+    if not isinstance(salt, str) or not isinstance(check, str):
+        raise BackupError('The backup header is missing its salt or check value.')
+    try:
+        salt = base64.b64decode(salt, validate=True)
+    except ValueError:
+        raise BackupError('The backup header has an invalid salt.')
+    if not salt:
+        raise BackupError('The backup header has an invalid salt.')
+    backup_fernet = derive_fernet(passphrase, salt)
+    try:
+        backup_fernet.decrypt(check.encode())
+    except InvalidToken:
+        raise BackupError('Wrong passphrase for this backup.')
+
+    for line_number, line in enumerate(text_stream, start=2):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(backup_fernet.decrypt(line.encode()))
+        except (InvalidToken, ValueError):
+            yield line_number, 'Record is corrupt and could not be decrypted.'
+            continue
+        yield line_number, record
+
+def restore_file(user_id, binary_stream, passphrase, batch_size=500, workers=4):
+    """Restore a backup archive through the bulk import path."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8')
+    try:
+        return import_keys(user_id, read_backup(text_stream, passphrase), batch_size=batch_size, workers=workers)
+    finally:
+        text_stream.detach()
@@ -0,0 +1,170 @@
+"""Compare the WSGI and async (ASGI) serving modes under concurrent load.
+
+Seeds one wallet, then for each mode starts a real server in a child
+process (werkzeug's threaded server, one thread per request, for WSGI;
+uvicorn running asgi:app for ASGI) and fires batches of concurrent
+requests at the JSON endpoints with httpx. Records throughput and latency
+percentiles per mode, endpoint and concurrency level.
+
+    python benchmarks/bench_async.py --concurrency 10,100,1000 --output async.json
+    python benchmarks/bench_async.py --database-url postgresql://localhost/bench --keys 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_routes import PASSWORD, ROOT, configure_environment, git_revision, seed_user
+
+MODES = ('wsgi', 'asgi')
+
+
+def serve(mode, port):
+    from app import create_app
+    # Throttling would turn the load into 429/503s; this measures the serving modes themselves
+    app = create_app({'WTF_CSRF_ENABLED': False, 'RATE_LIMIT_ENABLED': False, 'DECRYPT_MAX_IN_FLIGHT': 1000000})
+    if mode == 'wsgi':
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from async_api import create_asgi_app
+        uvicorn.run(create_asgi_app(app), host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port)], cwd=ROOT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+async def run_batch(client, method, path, concurrency, requests):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path)
+                if response.status_code >= 400:
+                    failures += 1
+            except Exception:
+                failures += 1
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    def percentile(p):
+        return round(timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))], 2)
+    return {
+        'requests': requests,
+        'failures': failures,
+        'requests_per_second': round(requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99)
+    }
+
+
+async def benchmark_mode(base_url, email, key_id, levels, requests):
+    import httpx
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await client.post('/login', data={'email': email, 'password': PASSWORD})
+        cases = {
+            'copy_key': ('POST', f'/copy_key/{key_id}'),
+            'get_categories_and_keys': ('GET', '/get_categories_and_keys'),
+        }
+        results = {}
+        for route, (method, path) in cases.items():
+            await run_batch(client, method, path, min(levels), min(requests, 20))  # warm up
+            for concurrency in levels:
+                results[(route, concurrency)] = await run_batch(client, method, path, concurrency, max(requests, concurrency))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='10,100,1000', help='Comma-separated numbers of in-flight requests.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and concurrency level.')
+    parser.add_argument('--keys', type=int, default=200, help='Size of the seeded wallet.')
+    parser.add_argument('--database-url', help='Throwaway database to use; defaults to a temporary SQLite file.')
+    parser.add_argument('--output', default='bench_async_results.json', help='Where to write the JSON results.')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.path.insert(0, ROOT)
+        serve(args.serve, args.port)
+        return
+
+    tmpdir = tempfile.TemporaryDirectory()
+    configure_environment(args.database_url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}")
+    from app import create_app
+    from extensions import db
+    from hashing import password_hasher
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    email, key_id = seed_user(app, db, args.keys, password_hasher.hash(PASSWORD))
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    output = {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': args.database_url.split(':', 1)[0] if args.database_url else 'sqlite',
+            'wallet_size': args.keys
+        },
+        'results': []
+    }
+    for mode in MODES:
+        process, base_url = start_server(mode)
+        try:
+            results = asyncio.run(benchmark_mode(base_url, email, key_id, levels, args.requests))
+        finally:
+            process.terminate()
+            process.wait()
+        for (route, concurrency), result in results.items():
+            output['results'].append({'mode': mode, 'route': route, 'concurrency': concurrency, **result})
+            print(f"{mode:<5} {route:<26} c={concurrency:<5} {result['requests_per_second']:>8.1f} req/s "
+                  f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms failures={result['failures']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Route benchmarks against synthetic wallets.
+
+Seeds one user per wallet size into a throwaway database (a temporary
+SQLite file unless --database-url points at a local Postgres), drives the
+routes through the Flask test client and records latency percentiles,
+SQL statements per request and peak Python memory per request.
+
+    python benchmarks/bench_routes.py --sizes 10,1000,50000 --output bench.json
+    python benchmarks/bench_routes.py --compare bench.json --output bench-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'benchmark-password'
+
+
+def configure_environment(database_url):
+    from cryptography.fernet import Fernet
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('APP_ENV', 'production')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+
+
+def seed_user(app, db, size, password_hash):
+    from sqlalchemy import insert
+    from models import User, APIKey, Category
+    from utils import encrypt_key
+
+    with app.app_context():
+        user = User(email=f'bench-{size}@example.com', password_hash=password_hash)
+        db.session.add(user)
+        db.session.flush()
+        category_count = max(1, min(50, size // 100))
+        categories = [Category(name=f'Category {i:02d}', user_id=user.id) for i in range(category_count)]
+        db.session.add_all(categories)
+        db.session.flush()
+        category_ids = [None] + [category.id for category in categories]
+        # A handful of distinct tokens keeps seeding fast; decrypt cost is the same for every token
+        tokens = [encrypt_key(f'secret-{i}') for i in range(16)]
+        rows = [
+            {
+                'user_id': user.id,
+                'key_name': f'Key {i:06d}',
+                'ciphertext': tokens[i % len(tokens)],
+                'category_id': category_ids[i % len(category_ids)]
+            }
+            for i in range(size)
+        ]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(APIKey), rows[start:start + 5000])
+        db.session.commit()
+        first_key = db.session.query(APIKey.id).filter_by(user_id=user.id).order_by(APIKey.id).first()
+        return user.email, first_key[0] if first_key else None
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def login(app, email):
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': PASSWORD})
+    return client
+
+
+def run_case(counter, call, iterations, setup=None):
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        counter.count = 0
+        start = time.perf_counter()
+        response = call(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        if response.status_code >= 400:
+            raise RuntimeError(f'Benchmark request failed with {response.status_code}: {response.data[:200]!r}')
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    call(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    def percentile(p):
+        return round(timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))], 3)
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'peak_kib': round(peak / 1024, 1)
+    }
+
+
+def benchmark_size(app, db, counter, size, iterations, password_hash):
+    email, first_key_id = seed_user(app, db, size, password_hash)
+    client = login(app, email)
+    results = {}
+
+    results['wallet'] = run_case(counter, lambda: client.get('/wallet'), iterations)
+    results['get_categories_and_keys'] = run_case(counter, lambda: client.get('/get_categories_and_keys'), iterations)
+    results['copy_key'] = run_case(counter, lambda: client.post(f'/copy_key/{first_key_id}'), iterations)
+
+    added = []
+    def add_key():
+        response = client.post('/add_key', data={'key_name': 'Bench added key', 'api_key': 'bench-secret', 'category': 0})
+        added.append(response.get_json()['key']['id'])
+        return response
+    results['add_key'] = run_case(counter, add_key, iterations)
+
+    def next_added_key():
+        if not added:
+            add_key()
+        return (added.pop(),)
+    results['delete_key'] = run_case(counter, lambda key_id: client.post(f'/delete_key/{key_id}'), iterations, setup=next_added_key)
+
+    # Alternates the first 100 keys between Uncategorized and one of the user's categories
+    with app.app_context():
+        from models import APIKey
+        category_id = db.session.query(APIKey.category_id).filter(APIKey.id >= first_key_id, APIKey.category_id.isnot(None)).limit(1).scalar()
+    bulk_ids = list(range(first_key_id, first_key_id + min(size, 100)))
+    targets = []
+    def next_target():
+        targets.append(0 if len(targets) % 2 else category_id)
+        return (targets[-1],)
+    results['move_keys'] = run_case(
+        counter, lambda target: client.post('/move_keys', json={'key_ids': bulk_ids, 'category_id': target}),
+        iterations, setup=next_target
+    )
+
+    def fresh_client():
+        return (app.test_client(),)
+    results['login'] = run_case(
+        counter, lambda anonymous: anonymous.post('/login', data={'email': email, 'password': PASSWORD}),
+        max(1, iterations // 5), setup=fresh_client
+    )
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    old = {(r['wallet_size'], r['route']): r for r in previous['results']}
+    print(f"{'size':>7} {'route':<26} {'p50 ms':>16} {'p95 ms':>16} {'queries':>12}")
+    for result in current['results']:
+        before = old.get((result['wallet_size'], result['route']))
+        if not before:
+            continue
+        def delta(field):
+            return f"{before[field]:.1f}->{result[field]:.1f}"
+        print(f"{result['wallet_size']:>7} {result['route']:<26} {delta('p50_ms'):>16} {delta('p95_ms'):>16} {delta('queries_per_request'):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10,1000,50000', help='Comma-separated wallet sizes to seed.')
+    parser.add_argument('--iterations', type=int, default=30, help='Requests per route and size.')
+    parser.add_argument('--database-url', help='Throwaway database to use; defaults to a temporary SQLite file.')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results.')
+    parser.add_argument('--compare', help='Earlier results file to print deltas against.')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    configure_environment(args.database_url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}")
+
+    from app import create_app
+    from extensions import db
+    from hashing import password_hasher
+    app = create_app({'WTF_CSRF_ENABLED': False, 'RATE_LIMIT_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        counter = QueryCounter(db.engine)
+    password_hash = password_hasher.hash(PASSWORD)
+
+    output = {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': args.database_url.split(':', 1)[0] if args.database_url else 'sqlite',
+            'iterations': args.iterations
+        },
+        'results': []
+    }
+    for size in [int(size) for size in args.sizes.split(',')]:
+        for route, result in benchmark_size(app, db, counter, size, args.iterations, password_hash).items():
+            output['results'].append({'wallet_size': size, 'route': route, **result})
+            print(f"{size:>7} {route:<26} p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+                  f"queries={result['queries_per_request']} peak={result['peak_kib']}KiB")
+
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), output)
+    # Drain the write-behind buffers while the database still exists
+    from audit import audit_log
+    from usage import usage_tracker
+    audit_log.shutdown()
+    usage_tracker.shutdown()
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
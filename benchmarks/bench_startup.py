@@ -0,0 +1,82 @@
+"""Cold-start benchmarks for workers and the flask CLI.
+
+Each measurement runs in a fresh interpreter so module caches are cold:
+importing app, building the app with create_app(), serving the first
+request, and running `flask --help` / `flask db --help`. Nothing here
+needs a reachable database; a throwaway SQLite URL is used by default.
+
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PYTHON_CASES = {
+    'import_app': 'import app',
+    'create_app': 'import app; app.create_app()',
+    'first_request': "import app; app.create_app().test_client().get('/')",
+}
+
+CLI_CASES = {
+    'flask_help': ['--help'],
+    'flask_db_help': ['db', '--help'],
+}
+
+
+def environment(database_url):
+    from cryptography.fernet import Fernet
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', database_url)
+    env.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+    env.setdefault('SECRET_KEY', 'benchmark')
+    env.setdefault('APP_ENV', 'production')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    env['FLASK_APP'] = 'app'
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def time_command(command, env, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'runs': runs,
+        'median_ms': round(statistics.median(timings), 1),
+        'min_ms': round(timings[0], 1),
+        'max_ms': round(timings[-1], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Fresh interpreters per case.')
+    parser.add_argument('--output', default='startup_results.json', help='Where to write the JSON results.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = environment(f"sqlite:///{os.path.join(tmpdir, 'startup.db')}")
+        results = {'baseline_python': time_command([sys.executable, '-c', 'pass'], env, args.runs)}
+        for name, code in PYTHON_CASES.items():
+            results[name] = time_command([sys.executable, '-c', code], env, args.runs)
+        for name, cli_args in CLI_CASES.items():
+            results[name] = time_command([sys.executable, '-m', 'flask'] + cli_args, env, args.runs)
+
+    for name, result in results.items():
+        print(f"{name:<16} median={result['median_ms']:.1f}ms min={result['min_ms']:.1f}ms max={result['max_ms']:.1f}ms")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Measure api_key storage and the decrypt path before and after the binary backfill.
+
+Seeds keys in the legacy base64 text form, records the table's size and
+the time and allocations of decrypting every row, runs
+`flask keys backfill-binary`'s job and records the same figures again.
+Table size comes from pg_total_relation_size on Postgres and from the
+dbstat table on SQLite (when compiled in); the ciphertext column's
+bytes are reported on both.
+
+    python benchmarks/bench_storage.py --keys 20000 --output storage.json
+    python benchmarks/bench_storage.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_routes import configure_environment, git_revision
+
+
+def seed_legacy_keys(app, db, count):
+    from sqlalchemy import insert
+    from models import User, APIKey
+    from utils import get_fernets
+
+    with app.app_context():
+        user = User(email='bench-storage@example.com', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        fernet = get_fernets()[1]
+        # Realistic secret lengths; every row gets its own token, as in production
+        rows = [
+            {'user_id': user.id, 'key_name': f'Key {i:06d}', 'encrypted_key': fernet.encrypt(f'sk_live_{i:032d}'.encode()).decode()}
+            for i in range(count)
+        ]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(APIKey), rows[start:start + 5000])
+        db.session.commit()
+
+
+def table_bytes(db):
+    from sqlalchemy import text
+    from sqlalchemy.exc import SQLAlchemyError
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(text("SELECT pg_total_relation_size('api_key')")).scalar()
+    try:
+        return db.session.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'api_key'")).scalar()
+    except SQLAlchemyError:
+        db.session.rollback()
+        return None
+
+
+def measure(db):
+    from sqlalchemy import func
+    from models import APIKey
+    from utils import decrypt_key
+
+    column_bytes = db.session.query(
+        func.coalesce(func.sum(func.length(APIKey.ciphertext)), 0) + func.coalesce(func.sum(func.length(APIKey.encrypted_key)), 0)
+    ).scalar()
+    rows = db.session.query(APIKey.ciphertext, APIKey.encrypted_key).all()
+    stored = [row.ciphertext or row.encrypted_key for row in rows]
+
+    start = time.perf_counter()
+    for value in stored:
+        decrypt_key(value)
+    elapsed = time.perf_counter() - start
+
+    # Largest transient allocation of one decrypt, input conversion included
+    tracemalloc.start()
+    peaks = []
+    for value in stored[:1000]:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        decrypt_key(value)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return {
+        'rows': len(stored),
+        'table_bytes': table_bytes(db),
+        'key_column_bytes': int(column_bytes),
+        'key_bytes_per_row': round(column_bytes / len(stored), 1),
+        'decrypt_us_per_key': round(elapsed / len(stored) * 1e6, 2),
+        'decrypt_peak_bytes': max(peaks)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, default=20000, help='Rows to seed.')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Backfill chunk size.')
+    parser.add_argument('--database-url', help='Throwaway database to use; defaults to a temporary SQLite file.')
+    parser.add_argument('--output', default='bench_storage_results.json', help='Where to write the JSON results.')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    configure_environment(args.database_url or f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}")
+    from sqlalchemy import text
+    from app import create_app
+    from extensions import db
+    from rotation import backfill_binary_keys
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    seed_legacy_keys(app, db, args.keys)
+
+    with app.app_context():
+        before = measure(db)
+        start = time.perf_counter()
+        backfill_binary_keys(chunk_size=args.chunk_size)
+        backfill_seconds = time.perf_counter() - start
+        # Reclaim the space the rewritten rows left behind so sizes are comparable
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('VACUUM FULL api_key' if db.engine.dialect.name == 'postgresql' else 'VACUUM'))
+        after = measure(db)
+
+    output = {
+        'meta': {
+            'git_revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': args.database_url.split(':', 1)[0] if args.database_url else 'sqlite',
+            'keys': args.keys,
+            'backfill_seconds': round(backfill_seconds, 2)
+        },
+        'text': before,
+        'binary': after
+    }
+    print(f"{'':<28} {'text':>12} {'binary':>12}")
+    for field in before:
+        print(f"{field:<28} {str(before[field]):>12} {str(after[field]):>12}")
+    print(f"backfill: {args.keys} rows in {backfill_seconds:.2f}s")
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
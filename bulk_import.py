@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from audit import audit_log
+from extensions import db
+from models import User, APIKey, Category
+from utils import encrypt_key
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 1000
+
+def iter_rows(text_stream, fmt):
+    """Yield (line_number, row) pairs from a CSV or JSON Lines text stream.
+
+    Rows that cannot be parsed are yielded as (line_number, error_message).
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, 'Each line must be a JSON object.'
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+def detect_format(filename, fmt=None):
+    if fmt:
+        return fmt.lower()
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+def validate_row(row):
+    if isinstance(row, str):
+        return None, row
+    for field in ('key_name', 'api_key', 'category', 'date_added'):
+        if not isinstance(row.get(field) or '', str):
+            return None, f'{field} must be a string.'
+    key_name = (row.get('key_name') or '').strip()
+    api_key = row.get('api_key') or ''
+    category = (row.get('category') or '').strip()
+    if not key_name:
+        return None, 'key_name is required.'
+    if len(key_name) > 120:
+        return None, 'key_name must be at most 120 characters.'
+    if not api_key:
+        return None, 'api_key is required.'
+    if len(category) > 50:
+        return None, 'category must be at most 50 characters.'
+    if category == 'Uncategorized':
+        category = ''
+    # Optional; backups carry it so a restore keeps the original dates
+    date_added = (row.get('date_added') or '').strip()
+    if date_added:
+        try:
+            date_added = datetime.fromisoformat(date_added)
+        except ValueError:
+            return None, 'date_added must be an ISO 8601 date.'
+    return {'key_name': key_name, 'api_key': api_key, 'category': category, 'date_added': date_added or None}, None
+
+def encrypt_row(row):
+    # Runs on the import pool; a failure is reported against its row instead of ending the import
+    try:
+        return encrypt_key(row['api_key']), None
+    except Exception as e:
+        logger.error('Encrypting an imported key failed: %s', e)
+        return None, 'api_key could not be encrypted.'
+
+def resolve_categories(user_id, names):
+    """Map category names to ids, creating any that do not exist yet."""
+    if not names:
+        return {}
+    existing = Category.query.filter(Category.user_id == user_id, Category.name.in_(names)).order_by(Category.id).all()
+    category_ids = {}
+    for category in existing:
+        category_ids.setdefault(category.name, category.id)
+    missing = [Category(name=name, user_id=user_id) for name in names if name not in category_ids]
+    if missing:
+        db.session.add_all(missing)
+        db.session.flush()
+        for category in missing:
+            category_ids[category.name] = category.id
+    return category_ids
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors)
+        }
+
+def import_keys(user_id, rows, batch_size=500, workers=4):
+    """Import (line_number, row) pairs for a user in chunked transactions.
+
+    Each batch is encrypted on a thread pool, its categories are resolved
+    with one lookup, and its keys are written with a multi-row INSERT and
+    committed, so only one batch is ever held in memory.
+    """
+    result = ImportResult()
+    rows = iter(rows)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            valid = []
+            for line_number, row in batch:
+                cleaned, error = validate_row(row)
+                if error:
+                    result.add_error(line_number, error)
+                else:
+                    valid.append((line_number, cleaned))
+            encrypted = []
+            for (line_number, row), (ciphertext, error) in zip(valid, executor.map(encrypt_row, [row for _, row in valid])):
+                if error:
+                    result.add_error(line_number, error)
+                else:
+                    encrypted.append((line_number, row, ciphertext))
+            valid = [(line_number, row) for line_number, row, _ in encrypted]
+            if not valid:
+                continue
+            now = datetime.utcnow()
+            try:
+                category_ids = resolve_categories(user_id, {row['category'] for _, row in valid if row['category']})
+                key_ids = db.session.execute(insert(APIKey).returning(APIKey.id), [
+                    {
+                        'user_id': user_id,
+                        'key_name': row['key_name'],
+                        'ciphertext': ciphertext,
+                        'category_id': category_ids.get(row['category']),
+                        'date_added': row['date_added'] or now
+                    }
+                    for _, row, ciphertext in encrypted
+                ]).scalars().all()
+                User.bump_wallet_version(user_id)
+                db.session.commit()
+                audit_log.record('add', user_id, key_ids)
+                result.imported += len(valid)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                logger.error('Database error importing batch at line %s: %s', valid[0][0], e)
+                for line_number, _ in valid:
+                    result.add_error(line_number, 'Database error while saving this row.')
+    return result
+
+def import_file(user_id, binary_stream, filename=None, fmt=None, batch_size=500, workers=4):
+    fmt = detect_format(filename, fmt)
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    try:
+        return import_keys(user_id, iter_rows(text_stream, fmt), batch_size=batch_size, workers=workers)
+    finally:
+        text_stream.detach()
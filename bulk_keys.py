@@ -0,0 +1,65 @@
+from sqlalchemy import delete, select, update
+from extensions import db
+from models import APIKey, Category
+
+UNCATEGORIZED = 'Uncategorized'
+
+class CategoryNotFound(LookupError):
+    pass
+
+def selected_keys(user_id, key_ids=None, category_id=None):
+    """WHERE clause for a user's keys picked by id or by category (0 for Uncategorized).
+
+    The user_id term is the ownership check: ids belonging to someone else
+    simply match nothing.
+    """
+    clause = APIKey.user_id == user_id
+    if key_ids is not None:
+        return clause & APIKey.id.in_(key_ids)
+    if category_id == 0:
+        return clause & APIKey.category_id.is_(None)
+    return clause & (APIKey.category_id == category_id)
+
+def target_category_name(user_id, category_id):
+    if category_id == 0:
+        return UNCATEGORIZED
+    name = db.session.execute(select(Category.name).where(Category.id == category_id, Category.user_id == user_id)).scalar()
+    if name is None:
+        raise CategoryNotFound(category_id)
+    return name
+
+def move_keys(user_id, category_id, key_ids=None, from_category_id=None):
+    """Move the selected keys into category_id (0 for Uncategorized) with one UPDATE.
+
+    Returns (moved key ids, category_name). Raises CategoryNotFound if the
+    target is not one of the user's categories. Runs in the caller's transaction.
+    """
+    category_name = target_category_name(user_id, category_id)
+    statement = update(APIKey).where(selected_keys(user_id, key_ids, from_category_id)) \
+        .values(category_id=category_id or None).returning(APIKey.id).execution_options(synchronize_session=False)
+    return db.session.execute(statement).scalars().all(), category_name
+
+def delete_keys(user_id, key_ids=None, category_id=None):
+    """Delete the selected keys with one DELETE; returns their ids. Runs in the caller's transaction."""
+    statement = delete(APIKey).where(selected_keys(user_id, key_ids, category_id)).returning(APIKey.id) \
+        .execution_options(synchronize_session=False)
+    return db.session.execute(statement).scalars().all()
+
+def delete_category(user_id, category_id, delete_contents=False):
+    """Delete a category, first moving its keys to Uncategorized (or deleting them).
+
+    Two set-based statements instead of the ORM loading every key to null
+    its foreign key. Returns the ids of the keys moved or deleted. Raises
+    CategoryNotFound if the category is not the user's.
+    """
+    if not category_id:
+        raise CategoryNotFound(category_id)
+    target_category_name(user_id, category_id)
+    if delete_contents:
+        affected = delete_keys(user_id, category_id=category_id)
+    else:
+        affected, _ = move_keys(user_id, 0, from_category_id=category_id)
+    statement = delete(Category).where(Category.id == category_id, Category.user_id == user_id) \
+        .execution_options(synchronize_session=False)
+    db.session.execute(statement)
+    return affected
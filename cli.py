@@ -0,0 +1,146 @@
+import json
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from flask_migrate import stamp
+from extensions import db
+from models import User
+
+keys_cli = AppGroup('keys', help='Bulk operations on users\' API keys.')
+assets_cli = AppGroup('assets', help='Static asset build.')
+audit_cli = AppGroup('audit', help='Audit log maintenance.')
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create all tables in an empty database and mark it as migrated to head."""
+    db.create_all()
+    if db.engine.dialect.name == 'postgresql':
+        # Same months migration c4e2a9d07b31 starts with
+        from audit import ensure_partitions
+        with db.engine.begin() as connection:
+            ensure_partitions(connection, months_ahead=3)
+    stamp()
+    click.echo('Database initialized.')
+
+def get_user(email):
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f'No user with email {email}')
+    return user
+
+@keys_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--email', required=True, help='Owner of the imported keys.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per transaction.')
+@click.option('--workers', type=int, help='Encryption threads.')
+def import_command(source, email, fmt, batch_size, workers):
+    """Import API keys from a CSV or JSON Lines file (use - for stdin)."""
+    from bulk_import import import_file
+    user = get_user(email)
+    result = import_file(
+        user.id, source, filename=source.name, fmt=fmt,
+        batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+        workers=workers or current_app.config['IMPORT_WORKERS']
+    )
+    click.echo(json.dumps(result.to_dict(), indent=2))
+
+@keys_cli.command('export')
+@click.argument('destination', type=click.File('w'))
+@click.option('--email', required=True, help='Owner of the exported keys.')
+@click.option('--passphrase', prompt=True, hide_input=True, confirmation_prompt=True, help='Passphrase the backup is encrypted with.')
+@click.option('--chunk-size', type=int, help='Rows fetched and written per chunk.')
+def export_command(destination, email, passphrase, chunk_size):
+    """Write an encrypted backup of a user's API keys (use - for stdout)."""
+    from backup import export_lines, BackupError
+    user = get_user(email)
+    try:
+        for chunk in export_lines(user.id, passphrase, chunk_size=chunk_size or current_app.config['EXPORT_CHUNK_SIZE']):
+            destination.write(chunk)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+
+@keys_cli.command('restore')
+@click.argument('source', type=click.File('rb'))
+@click.option('--email', required=True, help='Owner of the restored keys.')
+@click.option('--passphrase', prompt=True, hide_input=True, help='Passphrase the backup was encrypted with.')
+@click.option('--batch-size', type=int, help='Rows per transaction.')
+@click.option('--workers', type=int, help='Encryption threads.')
+def restore_command(source, email, passphrase, batch_size, workers):
+    """Restore API keys from an encrypted backup (use - for stdin)."""
+    from backup import restore_file, BackupError
+    user = get_user(email)
+    try:
+        result = restore_file(
+            user.id, source, passphrase,
+            batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+            workers=workers or current_app.config['IMPORT_WORKERS']
+        )
+    except BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(result.to_dict(), indent=2))
+
+@keys_cli.command('rotate')
+@click.option('--chunk-size', type=int, default=500, show_default=True, help='Rows re-encrypted and committed per chunk.')
+@click.option('--workers', type=int, default=2, show_default=True, help='Re-encryption processes.')
+@click.option('--rows-per-second', type=float, help='Throughput cap so live traffic is not starved.')
+@click.option('--restart', is_flag=True, help='Start a new job instead of resuming the last unfinished one.')
+def rotate_command(chunk_size, workers, rows_per_second, restart):
+    """Re-encrypt all API keys under the current ENCRYPTION_KEY.
+
+    Set ENCRYPTION_KEY to the new key and OLD_ENCRYPTION_KEYS to the
+    previous ones first; the app keeps serving while this runs.
+    """
+    from rotation import rotate_all_keys
+    job = rotate_all_keys(
+        chunk_size=chunk_size, workers=workers, rows_per_second=rows_per_second, restart=restart,
+        progress=lambda job: click.echo(f'job {job.id}: through key_id {job.last_key_id}, {job.rotated_count} re-encrypted')
+    )
+    click.echo(f'Rotation job {job.id} finished: {job.rotated_count} keys re-encrypted.')
+
+@keys_cli.command('backfill-binary')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Rows converted and committed per chunk.')
+@click.option('--rows-per-second', type=float, help='Throughput cap so live traffic is not starved.')
+def backfill_binary_command(chunk_size, rows_per_second):
+    """Convert keys still stored as base64 text to the packed binary column.
+
+    Safe to run while the app serves traffic, and to rerun after an interruption.
+    """
+    from rotation import backfill_binary_keys
+    converted = backfill_binary_keys(
+        chunk_size=chunk_size, rows_per_second=rows_per_second,
+        progress=lambda last_key_id, converted: click.echo(f'through key_id {last_key_id}: {converted} converted')
+    )
+    click.echo(f'Backfill finished: {converted} keys converted.')
+
+@assets_cli.command('build')
+def build_assets_command():
+    """Write fingerprinted, precompressed copies of static/ to static/dist."""
+    from assets import build_assets
+    manifest = build_assets(current_app.static_folder)
+    for source, hashed in sorted(manifest.items()):
+        click.echo(f'{source} -> {hashed}')
+    if not current_app.config['STATIC_FINGERPRINTS']:
+        click.echo('Note: STATIC_FINGERPRINTS is off, so the build is not served until it is enabled.')
+
+@audit_cli.command('partitions')
+@click.option('--months-ahead', type=int, default=3, show_default=True, help='Future months to create partitions for.')
+@click.option('--retain-months', type=int, help='Drop partitions older than this many months.')
+def audit_partitions_command(months_ahead, retain_months):
+    """Create upcoming monthly audit_event partitions and drop expired ones (Postgres only).
+
+    Run it from a scheduler at least monthly.
+    """
+    from audit import ensure_partitions, drop_partitions_before, month_start
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('audit_event is only partitioned on Postgres.')
+    with db.engine.begin() as connection:
+        for name in ensure_partitions(connection, months_ahead):
+            click.echo(f'created {name}')
+        if retain_months is not None:
+            cutoff = month_start(datetime.utcnow(), -retain_months)
+            for name in drop_partitions_before(connection, cutoff):
+                click.echo(f'dropped {name}')
+
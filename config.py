@@ -0,0 +1,75 @@
+import os
+from hashing import DEFAULT_METHOD
+
+def config_from_env():
+    """Read the app's settings from the environment; create_app applies overrides on top."""
+    app_env = os.environ.get('APP_ENV', 'development')
+    production = app_env == 'production'
+    return {
+        'APP_ENV': app_env,
+        'SECRET_KEY': os.environ.get('SECRET_KEY', os.urandom(24)),
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Comma-separated read replicas; SELECTs in REPLICA_READ_ENDPOINTS go to them (see replicas.py)
+        'REPLICA_DATABASE_URIS': [uri.strip() for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri.strip()],
+        'REPLICA_READ_ENDPOINTS': [endpoint.strip() for endpoint in os.environ.get(
+            'REPLICA_READ_ENDPOINTS', 'main.wallet,main.get_categories_and_keys,main.manage_categories,main.copy_key,main.get_key,main.audit_events'
+        ).split(',') if endpoint.strip()],
+        # After a write, that user's reads stay on the primary this long so they see their own writes
+        'REPLICA_STICKY_SECONDS': float(os.environ.get('REPLICA_STICKY_SECONDS', 5)),
+        'REPLICA_CHECK_INTERVAL': float(os.environ.get('REPLICA_CHECK_INTERVAL', 10)),
+        'REPLICA_MAX_LAG': float(os.environ.get('REPLICA_MAX_LAG', 5)),
+        # SQL echo goes through the logging queue instead of SQLAlchemy's own stderr handler
+        'SQLALCHEMY_ECHO': False,
+        'SQL_ECHO': os.environ.get('SQL_ECHO', 'false' if production else 'true').lower() == 'true',
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO' if production else 'DEBUG').upper(),
+        'LOG_SAMPLE_RATES': os.environ.get('LOG_SAMPLE_RATES'),
+        'LOG_QUEUE_SIZE': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+        'IMPORT_BATCH_SIZE': int(os.environ.get('IMPORT_BATCH_SIZE', 500)),
+        'IMPORT_WORKERS': int(os.environ.get('IMPORT_WORKERS', 4)),
+        'EXPORT_CHUNK_SIZE': int(os.environ.get('EXPORT_CHUNK_SIZE', 500)),
+        'REVEAL_WORKERS': int(os.environ.get('REVEAL_WORKERS', 4)),
+        'REVEAL_MAX_KEYS': int(os.environ.get('REVEAL_MAX_KEYS', 500)),
+        # Reveal counts and last-access times are buffered per process and written every USAGE_FLUSH_INTERVAL seconds
+        'USAGE_TRACKING_ENABLED': os.environ.get('USAGE_TRACKING_ENABLED', 'true').lower() == 'true',
+        'USAGE_FLUSH_INTERVAL': float(os.environ.get('USAGE_FLUSH_INTERVAL', 30)),
+        'USAGE_MAX_PENDING': int(os.environ.get('USAGE_MAX_PENDING', 10000)),
+        # Audit events are queued in memory and inserted in batches of AUDIT_BATCH_SIZE at least every AUDIT_FLUSH_INTERVAL seconds
+        'AUDIT_ENABLED': os.environ.get('AUDIT_ENABLED', 'true').lower() == 'true',
+        'AUDIT_BATCH_SIZE': int(os.environ.get('AUDIT_BATCH_SIZE', 500)),
+        'AUDIT_FLUSH_INTERVAL': float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1)),
+        'AUDIT_QUEUE_SIZE': int(os.environ.get('AUDIT_QUEUE_SIZE', 100000)),
+        # Longest key_ids list /move_keys and /delete_keys accept; selecting by category has no limit
+        'BULK_MAX_KEYS': int(os.environ.get('BULK_MAX_KEYS', 1000)),
+        # Password hashing runs on its own bounded pool; PASSWORD_HASH_METHOD uses werkzeug's full form, e.g. scrypt:32768:8:1
+        'PASSWORD_HASH_METHOD': os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        'PASSWORD_HASH_WORKERS': int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+        'PASSWORD_HASH_QUEUE_LIMIT': int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 8)),
+        'USER_CACHE_SIZE': int(os.environ.get('USER_CACHE_SIZE', 10000)),
+        'USER_CACHE_TTL': float(os.environ.get('USER_CACHE_TTL', 60)),
+        # Where revoked sessions are published to every process's user cache; memory:// or redis://...
+        'USER_CACHE_URL': os.environ.get('USER_CACHE_URL', 'memory://'),
+        # Rendered wallet bodies, keyed by user, filter, page size, sort and wallet version stamp; memory:// or redis://...
+        'FRAGMENT_CACHE_ENABLED': os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true',
+        'FRAGMENT_CACHE_URL': os.environ.get('FRAGMENT_CACHE_URL', 'memory://'),
+        'FRAGMENT_CACHE_MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 2000)),
+        'FRAGMENT_CACHE_MAX_BYTES': int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        'FRAGMENT_CACHE_TTL': float(os.environ.get('FRAGMENT_CACHE_TTL', 600)),
+        'SERVER_TIMING': os.environ.get('SERVER_TIMING', 'false').lower() == 'true',
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+        # Decrypt endpoints: token buckets (tokens/second, burst) per user and per client IP, shared
+        # through RATE_LIMIT_STORAGE_URL (memory:// or redis://...), plus a cap on decrypts in flight
+        'RATE_LIMIT_ENABLED': os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+        'RATE_LIMIT_STORAGE_URL': os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://'),
+        'RATE_LIMIT_USER_RATE': float(os.environ.get('RATE_LIMIT_USER_RATE', 5)),
+        'RATE_LIMIT_USER_BURST': int(os.environ.get('RATE_LIMIT_USER_BURST', 30)),
+        'RATE_LIMIT_IP_RATE': float(os.environ.get('RATE_LIMIT_IP_RATE', 10)),
+        'RATE_LIMIT_IP_BURST': int(os.environ.get('RATE_LIMIT_IP_BURST', 60)),
+        'DECRYPT_MAX_IN_FLIGHT': int(os.environ.get('DECRYPT_MAX_IN_FLIGHT', 32)),
+        # Number of proxies in front of the app whose X-Forwarded-For is trusted; needed for per-IP limits behind a proxy
+        'PROXY_FIX_X_FOR': int(os.environ.get('PROXY_FIX_X_FOR', 0)),
+        # Serve the `flask assets build` output (hashed names, precompressed, immutable) when it exists
+        'STATIC_FINGERPRINTS': os.environ.get('STATIC_FINGERPRINTS', 'true' if production else 'false').lower() == 'true',
+        # Threads serving the Flask routes when running under asgi:app
+        'ASGI_WSGI_WORKERS': int(os.environ.get('ASGI_WSGI_WORKERS', 10)),
+    }
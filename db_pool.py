@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += waited
+            if waited > self.max_wait:
+                self.max_wait = waited
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts_total': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'wait_seconds_total': round(self.total_wait, 6),
+                'wait_seconds_max': round(self.max_wait, 6),
+                'wait_seconds_avg': round(self.total_wait / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to get a connection.
+
+    Each pool (primary, every replica) keeps its own wait_stats.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return conn
+
+def engine_options(database_uri):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* environment variables.
+
+    SQLite picks its own pool class, so only pre-ping/recycle are applied there.
+    """
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+    }
+    if database_uri and not database_uri.startswith('sqlite'):
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        })
+    return options
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'pool_size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats.update(pool.wait_stats.snapshot())
+    return stats
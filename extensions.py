@@ -0,0 +1,9 @@
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import LoginManager
+from flask_migrate import Migrate
+from replicas import RoutingSession
+
+# Created unbound so models and routes can import them without importing the app
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+login_manager = LoginManager()
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import threading
+import backends
+
+logger = logging.getLogger(__name__)
+
+def _utf8_size(value):
+    return len(value.encode())
+
+def backend_from_url(url, max_entries, max_bytes, ttl):
+    return backends.backend_from_url(
+        url, 'FRAGMENT_CACHE_URL', 'fragment:', max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, sizeof=_utf8_size
+    )
+
+class FragmentCache:
+    """Rendered HTML fragments keyed by whatever determines their content.
+
+    Callers put a version that changes on every relevant write in the key
+    (the wallet uses User.wallet_version), so entries are never
+    invalidated explicitly; stale ones age out through the LRU and TTL.
+    Backend errors are logged and treated as misses.
+    """
+
+    def __init__(self, backend=None, enabled=True):
+        self._lock = threading.Lock()
+        self.configure(backend or backend_from_url(None, 2000, 64 * 1024 * 1024, 600), enabled)
+
+    def configure(self, backend, enabled=True, salt=''):
+        self.backend = backend
+        self.enabled = enabled
+        # Changes when the template does, so a deploy never serves fragments rendered by old markup
+        self.salt = salt
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.stored_bytes = 0
+        self.errors = 0
+
+    def key(self, *parts):
+        return ':'.join(str(part) for part in (self.salt,) + parts)
+
+    def _count_error(self, operation, e):
+        with self._lock:
+            self.errors += 1
+        logger.warning("Fragment cache %s failed: %s", operation, e)
+
+    def get_or_render(self, key, render):
+        """Return the cached fragment for key, rendering and storing it on a miss."""
+        if not self.enabled:
+            return render()
+        try:
+            fragment = self.backend.get(key)
+        except Exception as e:
+            self._count_error('get', e)
+            fragment = None
+        if fragment is not None:
+            with self._lock:
+                self.hits += 1
+                self.hit_bytes += _utf8_size(fragment)
+            return fragment
+
+        fragment = render()
+        try:
+            self.backend.set(key, fragment)
+        except Exception as e:
+            self._count_error('set', e)
+        with self._lock:
+            self.misses += 1
+            self.stored_bytes += _utf8_size(fragment)
+        return fragment
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else 0.0,
+                'hit_bytes': self.hit_bytes,
+                'stored_bytes': self.stored_bytes,
+                'errors': self.errors
+            }
+        stats.update(self.backend.stats())
+        return stats
+
+def template_salt(app, *template_names):
+    """Short hash of the given templates' source."""
+    digest = hashlib.sha256()
+    for name in template_names:
+        source, _, _ = app.jinja_env.loader.get_source(app.jinja_env, name)
+        digest.update(source.encode())
+    return digest.hexdigest()[:12]
+
+wallet_fragments = FragmentCache()
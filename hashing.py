@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+class HashingBusy(RuntimeError):
+    pass
+
+def method_prefix(method):
+    """The method part werkzeug stores in front of a hash made with method, without hashing anything.
+
+    werkzeug fills in default parameters ('scrypt' is stored as
+    'scrypt:32768:8:1'); this applies the same defaults.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Invalid hash method {method!r}')
+
+class PasswordHasher:
+    """Caps how many password hashes run at once, using a small dedicated pool.
+
+    The calling request thread still blocks until its hash is done; the pool
+    only bounds concurrency. At most workers hashes run at once and at most
+    queue_limit more wait; anything beyond that is rejected immediately with
+    HashingBusy so a login burst cannot tie up every request worker.
+    """
+
+    def __init__(self, workers=2, queue_limit=8, method=DEFAULT_METHOD):
+        self._executor = None
+        self._lock = threading.Lock()
+        self.configure(workers, queue_limit, method)
+        self.hash_count = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.rejected = 0
+
+    def configure(self, workers, queue_limit, method):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.method = method
+        self._method_prefix = method_prefix(method)
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.hash_count += 1
+                self.hash_seconds_total += elapsed
+                self.hash_seconds_max = max(self.hash_seconds_max, elapsed)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy('Password hashing is saturated; try again shortly.')
+        try:
+            future = self._get_executor().submit(self._timed, func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hash_count': self.hash_count,
+                'hash_seconds_total': round(self.hash_seconds_total, 6),
+                'hash_seconds_max': round(self.hash_seconds_max, 6),
+                'hash_seconds_avg': round(self.hash_seconds_total / self.hash_count, 6) if self.hash_count else 0.0,
+                'rejected': self.rejected,
+                'workers': self.workers,
+                'queue_limit': self.queue_limit,
+                'method': self.method
+            }
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,92 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking.
+
+    Records that pass the filters are formatted in the calling thread before
+    they are queued (QueueHandler.prepare), so %-args and tracebacks are
+    rendered from the objects as they were when logged, not as a request
+    has changed them by the time the listener thread gets there. The
+    listener thread only writes the finished lines.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RouteSamplingFilter(logging.Filter):
+    """Keep only a sample of a route's below-WARNING records.
+
+    The decision is made once per request, so a sampled request keeps all
+    of its log lines and an unsampled one drops all of them.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates or not has_request_context():
+            return True
+        sampled = g.get('_log_sampled')
+        if sampled is None:
+            rate = self.rates.get(request.endpoint, 1.0)
+            sampled = rate >= 1.0 or random.random() < rate
+            g._log_sampled = sampled
+        return sampled
+
+def parse_sample_rates(value):
+    """Parse 'main.copy_key=0.01,main.get_key=0.05' into {endpoint: rate}."""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        endpoint, rate = item.split('=', 1)
+        rates[endpoint.strip()] = float(rate)
+    return rates
+
+def configure_logging(level, sample_rates=None, queue_size=10000):
+    """Route all logging through a bounded queue drained by a background thread.
+
+    Returns the QueueListener; it is stopped (and the queue flushed) at exit.
+    Later calls, e.g. from a second create_app, only adjust the level.
+    """
+    global _listener
+    if _listener is not None:
+        logging.getLogger().setLevel(level)
+        return _listener
+    log_queue = queue.Queue(maxsize=queue_size)
+    # Records arrive fully formatted, so the stream handler's default '%(message)s' writes them as they are
+    stream_handler = logging.StreamHandler(sys.stderr)
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    queue_handler.addFilter(RouteSamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    _listener = listener
+    return listener
@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+import utils
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted(self._series.items())
+            for labels, (counts, total, count) in items:
+                label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+                prefix = label_text + ',' if label_text else ''
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+                lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+request_seconds = Histogram('keyguardian_request_seconds', 'Wall time per request.', ('endpoint',), LATENCY_BUCKETS)
+db_statements = Histogram('keyguardian_db_statements', 'SQL statements executed per request.', ('endpoint',), COUNT_BUCKETS)
+db_seconds = Histogram('keyguardian_db_seconds', 'Time spent executing SQL per request.', ('endpoint',), LATENCY_BUCKETS)
+crypto_seconds = Histogram('keyguardian_crypto_seconds', 'Time spent in encrypt_key/decrypt_key per request.', ('endpoint', 'operation'), LATENCY_BUCKETS)
+render_seconds = Histogram('keyguardian_template_render_seconds', 'Template render time per request.', ('endpoint',), LATENCY_BUCKETS)
+response_bytes = Histogram('keyguardian_response_bytes', 'Response body size.', ('endpoint',), SIZE_BUCKETS)
+HISTOGRAMS = [request_seconds, db_statements, db_seconds, crypto_seconds, render_seconds, response_bytes]
+
+# Extra sources (pool, caches, hasher) rendered as gauges: name -> callable returning a flat dict of numbers
+gauge_sources = {}
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+def _perf():
+    return g.setdefault('_perf', {'db_count': 0, 'db_time': 0.0, 'crypto': {}, 'render': 0.0})
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['_query_start'].pop()
+    if has_request_context():
+        perf = _perf()
+        perf['db_count'] += 1
+        perf['db_time'] += time.perf_counter() - start
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('_query_start'):
+        connection.info['_query_start'].pop()
+
+def _crypto_observer(operation, seconds):
+    # Work on the reveal/import pools runs outside the request context and is not attributed
+    if has_request_context():
+        crypto = _perf()['crypto']
+        crypto[operation] = crypto.get(operation, 0.0) + seconds
+
+def _before_render(sender, template, context, **extra):
+    g._render_start = time.perf_counter()
+
+def _after_render(sender, template, context, **extra):
+    start = g.pop('_render_start', None)
+    if start is not None:
+        _perf()['render'] += time.perf_counter() - start
+
+def _start_request():
+    g._request_start = time.perf_counter()
+    _perf()
+
+def _finish_request(response):
+    start = g.get('_request_start')
+    if start is None or request.endpoint == 'metrics':
+        return response
+    elapsed = time.perf_counter() - start
+    perf = _perf()
+    endpoint = _endpoint()
+    request_seconds.observe((endpoint,), elapsed)
+    db_statements.observe((endpoint,), perf['db_count'])
+    db_seconds.observe((endpoint,), perf['db_time'])
+    render_seconds.observe((endpoint,), perf['render'])
+    for operation, seconds in perf['crypto'].items():
+        crypto_seconds.observe((endpoint, operation), seconds)
+    if not response.is_streamed:
+        response_bytes.observe((endpoint,), response.calculate_content_length() or 0)
+
+    if current_app.config.get('SERVER_TIMING'):
+        timings = [
+            f'app;dur={elapsed * 1000:.2f}',
+            f'db;dur={perf["db_time"] * 1000:.2f};desc="{perf["db_count"]} statements"',
+            f'render;dur={perf["render"] * 1000:.2f}'
+        ]
+        timings += [f'{operation};dur={seconds * 1000:.2f}' for operation, seconds in perf['crypto'].items()]
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    for source, collect in sorted(gauge_sources.items()):
+        for name, value in sorted(collect().items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = f'keyguardian_{source}_{name}'
+                lines += [f'# TYPE {metric} gauge', f'{metric} {value}']
+    return '\n'.join(lines) + '\n'
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def instrument_engine(engine):
+    """Count and time engine's statements in the per-request metrics."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+def init_metrics(app, engine):
+    """Instrument app and engine and serve the results at /metrics."""
+    instrument_engine(engine)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    if _crypto_observer not in utils.timing_observers:
+        utils.timing_observers.append(_crypto_observer)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
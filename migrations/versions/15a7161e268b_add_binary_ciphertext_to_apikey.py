@@ -0,0 +1,56 @@
+"""Add binary ciphertext to APIKey
+
+Revision ID: 15a7161e268b
+Revises: 8b149c5c2d06
+Create Date: 2026-10-18 11:42:37.204518
+
+"""
+import base64
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '15a7161e268b'
+down_revision = '8b149c5c2d06'
+branch_labels = None
+depends_on = None
+
+
+# SQLite's batch mode rebuilds the table and cannot reflect these, so they are put back afterwards
+EXPRESSION_INDEXES = [
+    ('ix_api_key_user_category_lower_name', ['user_id', 'category_id', sa.text('lower(key_name)'), 'id']),
+    ('ix_api_key_user_lower_name', ['user_id', sa.text('lower(key_name)'), 'id']),
+]
+
+
+def restore_expression_indexes():
+    if op.get_bind().dialect.name == 'sqlite':
+        for name, columns in EXPRESSION_INDEXES:
+            op.create_index(name, 'api_key', columns, unique=False, if_not_exists=True)
+
+
+def upgrade():
+    # Both are catalog-only changes on Postgres; existing rows are converted
+    # afterwards by `flask keys backfill-binary` while the app reads either column
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ciphertext', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column('encrypted_key', existing_type=sa.Text(), nullable=True)
+    restore_expression_indexes()
+
+
+def downgrade():
+    # Turn packed ciphertexts (format byte + raw Fernet token) back into base64 text first
+    api_key = sa.table('api_key', sa.column('id', sa.Integer()), sa.column('ciphertext', sa.LargeBinary()),
+                       sa.column('encrypted_key', sa.Text()))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(api_key.c.id, api_key.c.ciphertext).where(api_key.c.encrypted_key.is_(None))).all()
+    if rows:
+        bind.execute(
+            api_key.update().where(api_key.c.id == sa.bindparam('key_id')).values(encrypted_key=sa.bindparam('token')),
+            [{'key_id': key_id, 'token': base64.urlsafe_b64encode(bytes(ciphertext)[1:]).decode()} for key_id, ciphertext in rows]
+        )
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.alter_column('encrypted_key', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('ciphertext')
+    restore_expression_indexes()
@@ -0,0 +1,32 @@
+"""Add key_rotation_job
+
+Revision ID: 1be1d2434180
+Revises: e178485e46a9
+Create Date: 2026-10-18 10:14:02.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1be1d2434180'
+down_revision = 'e178485e46a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('key_rotation_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('last_key_id', sa.Integer(), nullable=False),
+        sa.Column('rotated_count', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('key_rotation_job')
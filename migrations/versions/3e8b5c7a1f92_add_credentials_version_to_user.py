@@ -0,0 +1,26 @@
+"""Add credentials_version to User
+
+Revision ID: 3e8b5c7a1f92
+Revises: 9d2f6a41c8b7
+Create Date: 2026-10-18 17:40:21.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8b5c7a1f92'
+down_revision = '9d2f6a41c8b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('credentials_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('credentials_version')
@@ -0,0 +1,44 @@
+"""Add last_accessed and reveal_count to APIKey
+
+Revision ID: 5580410e5153
+Revises: 15a7161e268b
+Create Date: 2026-10-18 12:20:51.873402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5580410e5153'
+down_revision = '15a7161e268b'
+branch_labels = None
+depends_on = None
+
+
+# SQLite's batch mode rebuilds the table to drop a column and cannot reflect these,
+# so the downgrade puts them back as 15a7161e268b does
+EXPRESSION_INDEXES = [
+    ('ix_api_key_user_category_lower_name', ['user_id', 'category_id', sa.text('lower(key_name)'), 'id']),
+    ('ix_api_key_user_lower_name', ['user_id', sa.text('lower(key_name)'), 'id']),
+]
+
+
+def restore_expression_indexes():
+    if op.get_bind().dialect.name == 'sqlite':
+        for name, columns in EXPRESSION_INDEXES:
+            op.create_index(name, 'api_key', columns, unique=False, if_not_exists=True)
+
+
+def upgrade():
+    # A constant default makes both catalog-only changes on Postgres 11+
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_accessed', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('reveal_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('api_key', schema=None) as batch_op:
+        batch_op.drop_column('reveal_count')
+        batch_op.drop_column('last_accessed')
+    restore_expression_indexes()
@@ -0,0 +1,38 @@
+"""Add indexes for wallet queries
+
+Revision ID: 601371b42ee3
+Revises: 1be1d2434180
+Create Date: 2026-10-18 10:31:47.206611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '601371b42ee3'
+down_revision = '1be1d2434180'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_api_key_user_category_lower_name', 'api_key', ['user_id', 'category_id', sa.text('lower(key_name)'), 'id']),
+    ('ix_api_key_user_lower_name', 'api_key', ['user_id', sa.text('lower(key_name)'), 'id']),
+    ('ix_api_key_category_id', 'api_key', ['category_id']),
+    ('ix_category_user_name', 'category', ['user_id', 'name']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; if_not_exists lets a
+    # failed run be resumed after dropping any index Postgres left INVALID
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,41 @@
+"""Add trigram indexes for key and category search
+
+Revision ID: 8b149c5c2d06
+Revises: 601371b42ee3
+Create Date: 2026-10-18 10:52:13.640029
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b149c5c2d06'
+down_revision = '601371b42ee3'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_api_key_lower_name_trgm', 'api_key', 'key_name'),
+    ('ix_category_lower_name_trgm', 'category', 'name'),
+]
+
+
+def upgrade():
+    # Other backends search with the in-memory index in search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(name, table, [sa.text(f'lower({column}) gin_trgm_ops')], unique=False,
+                            if_not_exists=True, postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,26 @@
+"""Add usage_version to User
+
+Revision ID: 9d2f6a41c8b7
+Revises: c4e2a9d07b31
+Create Date: 2026-10-18 15:12:07.534921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f6a41c8b7'
+down_revision = 'c4e2a9d07b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('usage_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('usage_version')
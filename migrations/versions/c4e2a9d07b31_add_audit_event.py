@@ -0,0 +1,68 @@
+"""Add audit_event
+
+Revision ID: c4e2a9d07b31
+Revises: 5580410e5153
+Create Date: 2026-10-18 13:05:12.418730
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e2a9d07b31'
+down_revision = '5580410e5153'
+branch_labels = None
+depends_on = None
+
+
+def month_start(moment, offset=0):
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Monthly range partitions keep each index small and let old months be dropped whole;
+        # `flask audit partitions` creates the months after these
+        op.execute("""
+            CREATE TABLE audit_event (
+                id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+                occurred_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                user_id INTEGER NOT NULL,
+                key_id INTEGER,
+                action VARCHAR(16) NOT NULL,
+                ip VARCHAR(45),
+                PRIMARY KEY (id, occurred_at)
+            ) PARTITION BY RANGE (occurred_at)
+        """)
+        op.execute('CREATE TABLE audit_event_default PARTITION OF audit_event DEFAULT')
+        now = datetime.utcnow()
+        for offset in range(4):
+            start, end = month_start(now, offset), month_start(now, offset + 1)
+            op.execute(
+                f"CREATE TABLE audit_event_{start:%Y_%m} PARTITION OF audit_event "
+                f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+            )
+    else:
+        op.create_table('audit_event',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('occurred_at', sa.DateTime(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('key_id', sa.Integer(), nullable=True),
+            sa.Column('action', sa.String(length=16), nullable=False),
+            sa.Column('ip', sa.String(length=45), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    # On a partitioned table these are created on every partition, present and future
+    op.create_index('ix_audit_event_user_time', 'audit_event', ['user_id', 'occurred_at', 'id'], unique=False)
+    op.create_index('ix_audit_event_key_time', 'audit_event', ['key_id', 'occurred_at', 'id'], unique=False,
+                    postgresql_where=sa.text('key_id IS NOT NULL'), sqlite_where=sa.text('key_id IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_audit_event_key_time', table_name='audit_event')
+    op.drop_index('ix_audit_event_user_time', table_name='audit_event')
+    # Dropping the parent drops its partitions too
+    op.drop_table('audit_event')
@@ -0,0 +1,26 @@
+"""Add wallet_version to User
+
+Revision ID: e178485e46a9
+Revises: 81699dd1d304
+Create Date: 2026-10-18 10:05:41.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e178485e46a9'
+down_revision = '81699dd1d304'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('wallet_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('wallet_version')
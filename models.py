@@ -1,34 +1,64 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from hashing import password_hasher
+from extensions import db
 from datetime import datetime
+from sqlalchemy import DDL, event, func, update
 import logging
 
+logger = logging.getLogger(__name__)
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     date_joined = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every key or category write; drives wallet ETags
+    wallet_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped by usage flushes instead; only the last_used views, which show usage, key on it
+    usage_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Sessions carry it and stop working once it changes; bumped by user_cache.revoke_sessions only,
+    # so rehashing the password on login keeps the user's other sessions
+    credentials_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     api_keys = db.relationship('APIKey', backref='user', lazy='dynamic')
     categories = db.relationship('Category', backref='user', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
+
+    @staticmethod
+    def wallet_version_increment(user_id):
+        # Done in SQL so concurrent writers never lose an increment
+        return update(User).where(User.id == user_id).values(wallet_version=User.wallet_version + 1) \
+            .execution_options(synchronize_session=False)
+
+    @staticmethod
+    def bump_wallet_version(user_id):
+        # Commits with the caller's transaction
+        db.session.execute(User.wallet_version_increment(user_id))
 
 class APIKey(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     key_name = db.Column(db.String(120), nullable=False)
-    encrypted_key = db.Column(db.Text, nullable=False)
+    # Packed Fernet token (utils.pack_token); rows written before migration 15a7161e268b keep
+    # the base64 text in encrypted_key until `flask keys backfill-binary` converts them
+    ciphertext = db.Column(db.LargeBinary, nullable=True)
+    encrypted_key = db.Column(db.Text, nullable=True)
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
+    # Written behind by usage.usage_tracker, so they can trail reveals by one flush interval
+    last_accessed = db.Column(db.DateTime, nullable=True)
+    reveal_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __init__(self, *args, **kwargs):
         super(APIKey, self).__init__(*args, **kwargs)
-        logging.info(f"Creating new APIKey: user_id={self.user_id}, key_name={self.key_name}, category_id={self.category_id}")
+        logger.debug("Creating new APIKey: user_id=%s, key_name=%s, category_id=%s", self.user_id, self.key_name, self.category_id)
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,4 +68,49 @@ class Category(db.Model):
 
     def __init__(self, *args, **kwargs):
         super(Category, self).__init__(*args, **kwargs)
-        logging.info(f"Creating new Category: name={self.name}, user_id={self.user_id}")
+        logger.debug("Creating new Category: name=%s, user_id=%s", self.name, self.user_id)
+
+# Indexes for the wallet's hot queries; created concurrently by migration 601371b42ee3
+db.Index('ix_api_key_user_category_lower_name', APIKey.user_id, APIKey.category_id, func.lower(APIKey.key_name), APIKey.id)
+db.Index('ix_api_key_user_lower_name', APIKey.user_id, func.lower(APIKey.key_name), APIKey.id)
+db.Index('ix_api_key_category_id', APIKey.category_id)
+db.Index('ix_category_user_name', Category.user_id, Category.name)
+
+# Trigram indexes behind /search on Postgres; created concurrently by migration 8b149c5c2d06
+event.listen(db.metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+db.Index('ix_api_key_lower_name_trgm', func.lower(APIKey.key_name).label('lower_key_name'),
+         postgresql_using='gin', postgresql_ops={'lower_key_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+db.Index('ix_category_lower_name_trgm', func.lower(Category.name).label('lower_name'),
+         postgresql_using='gin', postgresql_ops={'lower_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+
+class AuditEvent(db.Model):
+    # Append-only and written in batches by audit.audit_log. No foreign keys: the trail
+    # outlives deleted keys and users. On Postgres it is range-partitioned by month on
+    # occurred_at, so its primary key there is (id, occurred_at); see the DDL below.
+    __table_args__ = {'postgresql_partition_by': 'RANGE (occurred_at)'}
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), db.Identity(), primary_key=True)
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    key_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(16), nullable=False)
+    ip = db.Column(db.String(45), nullable=True)
+
+# Per-user and per-key history, newest first
+db.Index('ix_audit_event_user_time', AuditEvent.user_id, AuditEvent.occurred_at, AuditEvent.id)
+db.Index('ix_audit_event_key_time', AuditEvent.key_id, AuditEvent.occurred_at, AuditEvent.id,
+         postgresql_where=AuditEvent.key_id.isnot(None), sqlite_where=AuditEvent.key_id.isnot(None))
+
+# create_all builds the same table migration c4e2a9d07b31 does: on Postgres the primary key must
+# include the partition column, and a default partition takes rows for months that
+# `flask audit partitions` has not created yet
+AuditEvent.__table__.primary_key.ddl_if(callable_=lambda ddl, target, bind, **kw: kw['dialect'].name != 'postgresql')
+event.listen(AuditEvent.__table__, 'after_create', DDL('ALTER TABLE audit_event ADD PRIMARY KEY (id, occurred_at)').execute_if(dialect='postgresql'))
+event.listen(AuditEvent.__table__, 'after_create', DDL('CREATE TABLE audit_event_default PARTITION OF audit_event DEFAULT').execute_if(dialect='postgresql'))
+
+class KeyRotationJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    last_key_id = db.Column(db.Integer, nullable=False, default=0)
+    rotated_count = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,142 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import contains_eager
+from extensions import db
+from models import User, APIKey
+
+SORTS = ('name', 'last_used')
+# Stands in for a missing last_accessed so never-used keys sort last and stay pageable
+NEVER_USED = datetime(1970, 1, 1)
+
+def sort_columns(sort):
+    """(columns, descending) for a wallet sort; ties are broken by id."""
+    if sort == 'last_used':
+        return (func.coalesce(APIKey.last_accessed, NEVER_USED), APIKey.id), True
+    return (func.lower(APIKey.key_name), APIKey.id), False
+
+def sort_order(sort):
+    columns, descending = sort_columns(sort)
+    return [column.desc() for column in columns] if descending else list(columns)
+
+def wallet_keys_select(user_id, category_id=None, sort='name'):
+    # Category is joined in so key.category never triggers a lazy load per key. Built as a
+    # plain select() so the async API runs the same statements through an AsyncSession.
+    statement = select(APIKey).outerjoin(APIKey.category).options(contains_eager(APIKey.category)).where(APIKey.user_id == user_id)
+    if category_id == 0:  # Uncategorized
+        statement = statement.where(APIKey.category_id.is_(None))
+    elif category_id:
+        statement = statement.where(APIKey.category_id == category_id)
+    return statement.order_by(*sort_order(sort))
+
+def wallet_versions_select(user_id):
+    return select(User.wallet_version, User.usage_version).where(User.id == user_id)
+
+def wallet_stamp(versions, sort='name'):
+    """Version a wallet view is cached and ETagged under, from a wallet_versions_select row.
+
+    Usage figures only appear in last_used views, so only those also follow
+    usage_version; a reveal leaves every name-sorted view cached.
+    """
+    if versions is None:
+        return None
+    wallet_version, usage_version = versions
+    return f'{wallet_version}.{usage_version}' if sort == 'last_used' else str(wallet_version)
+
+def serialize_key(key, sort='name'):
+    serialized = {
+        'id': key.id,
+        'key_name': key.key_name,
+        'category_id': key.category_id,
+        'date_added': key.date_added.isoformat()
+    }
+    if sort == 'last_used':
+        serialized.update({
+            'last_accessed': key.last_accessed.isoformat() if key.last_accessed else None,
+            'reveal_count': key.reveal_count
+        })
+    return serialized
+
+def group_keys_by_category(api_keys, categories, serialize=None):
+    # Keys arrive in sort order, so appending keeps each group sorted
+    grouped_keys = {category.name: [] for category in categories}
+    grouped_keys['Uncategorized'] = []
+    for key in api_keys:
+        group = key.category.name if key.category is not None else 'Uncategorized'
+        grouped_keys[group].append(serialize(key) if serialize else key)
+    return grouped_keys
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(key, sort='name'):
+    # Keyset position: (category, sort value, id); 0 stands for Uncategorized
+    if sort == 'last_used':
+        payload = [key.category_id or 0, (key.last_accessed or NEVER_USED).isoformat(), key.id, sort]
+    else:
+        payload = [key.category_id or 0, key.key_name.lower(), key.id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor):
+    """Return (category_id, sort value, key_id, sort)."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        category_id, value, key_id = payload[:3]
+        sort = payload[3] if len(payload) > 3 else 'name'
+        if sort == 'last_used':
+            value = datetime.fromisoformat(value)
+        elif sort == 'name':
+            value = str(value)
+        else:
+            raise ValueError(sort)
+        return int(category_id), value, int(key_id), sort
+    except (ValueError, TypeError, IndexError):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+def first_pages_select(user_id, page_size, category_id=None, sort='name'):
+    row_number = func.row_number().over(partition_by=APIKey.category_id, order_by=sort_order(sort)).label('row_number')
+    ranked = select(APIKey.id.label('id'), row_number).where(APIKey.user_id == user_id).subquery()
+    # Fetch one extra row per category to know whether another page exists
+    return wallet_keys_select(user_id, category_id, sort).join(ranked, ranked.c.id == APIKey.id).where(ranked.c.row_number <= page_size + 1)
+
+def split_first_pages(rows, page_size, sort='name'):
+    api_keys = []
+    pages = {}
+    next_cursors = {}
+    for key in rows:
+        group = key.category_id or 0
+        if group in next_cursors:
+            continue
+        page = pages.setdefault(group, [])
+        if len(page) < page_size:
+            api_keys.append(key)
+            page.append(key)
+        else:
+            next_cursors[group] = encode_cursor(page[-1], sort)
+    return api_keys, next_cursors
+
+def first_pages(user_id, page_size, category_id=None, sort='name'):
+    """Load the first page_size keys of every category in one query.
+
+    Returns (api_keys, next_cursors) where next_cursors maps a category id
+    (0 for Uncategorized) to the cursor of its next page.
+    """
+    rows = db.session.execute(first_pages_select(user_id, page_size, category_id, sort)).scalars().all()
+    return split_first_pages(rows, page_size, sort)
+
+def next_page(user_id, cursor, page_size):
+    """Load the page after cursor within the cursor's category, in the cursor's sort.
+
+    Returns (api_keys, next_cursor, sort); next_cursor is None on the last page.
+    """
+    category_id, value, key_id, sort = decode_cursor(cursor)
+    columns, descending = sort_columns(sort)
+    position = tuple_(*columns)
+    after = position < tuple_(value, key_id) if descending else position > tuple_(value, key_id)
+    statement = wallet_keys_select(user_id, category_id, sort).where(after)
+    rows = db.session.execute(statement.limit(page_size + 1)).scalars().all()
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1], sort), sort
+    return rows, None, sort
@@ -0,0 +1,154 @@
+import logging
+import math
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import jsonify, request
+from flask_login import current_user
+import backends
+
+logger = logging.getLogger(__name__)
+
+def backend_from_url(url):
+    return backends.backend_from_url(url, 'RATE_LIMIT_STORAGE_URL', 'ratelimit:')
+
+class RateLimiter:
+    """Per-identity token buckets, e.g. one per user and one per client IP.
+
+    limits maps a scope name to (tokens per second, burst). A request must
+    fit in every scope's bucket; check returns the longest wait among the
+    buckets that refused it.
+    """
+
+    def __init__(self, backend=None, limits=None, enabled=True):
+        self._lock = threading.Lock()
+        self.configure(backend or backends.MemoryBackend(), limits or {}, enabled)
+
+    def configure(self, backend, limits, enabled=True):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+        self.allowed = 0
+        self.limited = {scope: 0 for scope in limits}
+        self.backend_errors = 0
+
+    def check(self, cost=1, **identities):
+        """Return 0 if the request may proceed, else the seconds to wait before retrying."""
+        if not self.enabled:
+            return 0.0
+        retry_after = 0.0
+        refused = []
+        for scope, identity in identities.items():
+            if scope not in self.limits or identity is None:
+                continue
+            rate, burst = self.limits[scope]
+            try:
+                wait = self.backend.take(f'{scope}:{identity}', rate, burst, cost)
+            except Exception as e:
+                # Fail open: a broken shared store must not take reveals down; the concurrency cap still applies
+                with self._lock:
+                    self.backend_errors += 1
+                logger.warning("Rate limit backend error: %s", e)
+                continue
+            if wait > 0:
+                refused.append(scope)
+                retry_after = max(retry_after, wait)
+        with self._lock:
+            if refused:
+                for scope in refused:
+                    self.limited[scope] += 1
+            else:
+                self.allowed += 1
+        return retry_after
+
+    def stats(self):
+        with self._lock:
+            stats = {'allowed': self.allowed, 'backend_errors': self.backend_errors, 'backend': type(self.backend).__name__}
+            stats.update({f'limited_{scope}': count for scope, count in self.limited.items()})
+            return stats
+
+class Overloaded(RuntimeError):
+    pass
+
+class ConcurrencyCap:
+    """Admit at most limit callers at once and reject the rest immediately.
+
+    Rejecting early keeps latency flat for admitted requests instead of
+    letting a queue build up in front of the decrypt pool.
+    """
+
+    def __init__(self, limit=32):
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self.shed = 0
+
+    def configure(self, limit):
+        self.limit = limit
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.shed += 1
+                raise Overloaded('Too many decryptions in flight.')
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'peak': self.peak, 'shed': self.shed}
+
+decrypt_limiter = RateLimiter()
+decrypt_slots = ConcurrencyCap()
+
+TOO_MANY_REQUESTS = 'Too many requests. Please slow down and try again shortly.'
+OVERLOADED = 'The server is busy. Please try again in a moment.'
+
+def retry_after_header(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+def _error(message, status, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+class Throttled(Exception):
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+@contextmanager
+def decrypt_allowance(user_id, ip):
+    """Hold a decrypt slot for user_id, or raise Throttled if a limit or the cap refuses.
+
+    Every decrypt endpoint, WSGI or ASGI, goes through this.
+    """
+    retry_after = decrypt_limiter.check(user=user_id, ip=ip)
+    if retry_after:
+        raise Throttled(TOO_MANY_REQUESTS, 429, retry_after)
+    try:
+        with decrypt_slots.slot():
+            yield
+    except Overloaded:
+        raise Throttled(OVERLOADED, 503, 1)
+
+def throttle_decrypts(view):
+    """Apply the per-user/per-IP limits and the global decrypt cap to a login_required view."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        try:
+            with decrypt_allowance(current_user.id, request.remote_addr):
+                return view(*args, **kwargs)
+        except Throttled as e:
+            return _error(e.message, e.status, e.retry_after)
+    return wrapped
@@ -0,0 +1,191 @@
+import itertools
+import logging
+import threading
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lag = None
+        self.reads = 0
+        self.errors = 0
+        self.check_lock = threading.Lock()
+
+class ReplicaSet:
+    """Read replicas with periodic health checks, picked round-robin per request.
+
+    A replica is checked at most every check_interval seconds, inline by
+    whichever request finds it due; it is skipped while unreachable or
+    more than max_lag seconds behind. With no healthy replica, reads fall
+    back to the primary.
+    """
+
+    def __init__(self, engines, read_endpoints, sticky_seconds=5, check_interval=10, max_lag=5):
+        self.replicas = [Replica(f'replica_{index}', engine) for index, engine in enumerate(engines)]
+        self.read_endpoints = set(read_endpoints)
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.fallbacks = 0
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', lambda context, replica=replica: self._on_error(replica, context))
+
+    def _on_error(self, replica, context):
+        # Connection-level failures take the replica out until its next check
+        if context.is_disconnect or context.connection is None:
+            if replica.healthy:
+                logger.warning("Read replica %s failed and is marked unhealthy: %s", replica.name, context.original_exception)
+            replica.healthy = False
+            replica.checked_at = time.monotonic()
+            with self._lock:
+                replica.errors += 1
+
+    def _check(self, replica):
+        if not replica.check_lock.acquire(blocking=False):
+            return  # Another request is already checking it
+        try:
+            with replica.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    replica.lag = float(connection.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    connection.execute(text('SELECT 1'))
+                    replica.lag = 0.0
+            healthy = replica.lag <= self.max_lag
+            if not healthy and replica.healthy:
+                logger.warning("Read replica %s is %.1fs behind; reading from the primary", replica.name, replica.lag)
+        except Exception as e:
+            healthy = False
+            if replica.healthy:
+                logger.warning("Read replica %s health check failed: %s", replica.name, e)
+        finally:
+            replica.checked_at = time.monotonic()
+            replica.check_lock.release()
+        if healthy and not replica.healthy:
+            logger.info("Read replica %s is healthy again", replica.name)
+        replica.healthy = healthy
+
+    def pick(self):
+        """Return a healthy replica, or None to use the primary."""
+        now = time.monotonic()
+        candidates = []
+        for replica in self.replicas:
+            if now - replica.checked_at >= self.check_interval:
+                self._check(replica)
+            if replica.healthy:
+                candidates.append(replica)
+        if not candidates:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        return candidates[next(self._counter) % len(candidates)]
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'replicas': len(self.replicas),
+                'healthy': sum(replica.healthy for replica in self.replicas),
+                'primary_reads': self.primary_reads,
+                'sticky_reads': self.sticky_reads,
+                'fallbacks': self.fallbacks
+            }
+            for replica in self.replicas:
+                stats[f'{replica.name}_healthy'] = int(replica.healthy)
+                stats[f'{replica.name}_reads'] = replica.reads
+                stats[f'{replica.name}_errors'] = replica.errors
+                if replica.lag is not None:
+                    stats[f'{replica.name}_lag_seconds'] = replica.lag
+            return stats
+
+def _is_plain_select(clause):
+    return clause is not None and getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+def _replica_allowed(replicas):
+    """Decide once per request whether its reads may go to a replica."""
+    decision = g.get('_read_replica')
+    if decision is None:
+        decision = 'primary'
+        if request.endpoint in replicas.read_endpoints:
+            # Users who wrote recently read their own writes from the primary
+            if session.get('_primary_until', 0) > time.time():
+                decision = 'sticky'
+            else:
+                decision = 'replica'
+        g._read_replica = decision
+    return decision
+
+def _request_replica(replicas):
+    """The replica this request reads from, picked on its first read (None for the primary).
+
+    Replicas lag by different amounts, so reading the wallet version from
+    one and the keys from another could cache a stale body under a newer
+    version; every statement in a request uses the same one.
+    """
+    if '_replica' not in g:
+        g._replica = replicas.pick()
+    return g._replica
+
+class RoutingSession(Session):
+    """db.session that sends plain SELECTs in read-only endpoints to a replica.
+
+    Flushes, DML and SELECT ... FOR UPDATE always use the primary, and once
+    a session has written, the rest of its work stays on the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            replicas = current_app.extensions.get('replicas')
+            if not _is_plain_select(clause):
+                self.info['wrote'] = g._db_wrote = True
+            elif replicas is not None and not self.info.get('wrote'):
+                decision = _replica_allowed(replicas)
+                replica = _request_replica(replicas) if decision == 'replica' else None
+                with replicas._lock:
+                    if replica is not None:
+                        replica.reads += 1
+                        return replica.engine
+                    if decision == 'sticky':
+                        replicas.sticky_reads += 1
+                    else:
+                        replicas.primary_reads += 1
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _mark_sticky(response):
+    if g.get('_db_wrote'):
+        replicas = current_app.extensions['replicas']
+        session['_primary_until'] = time.time() + replicas.sticky_seconds
+    return response
+
+def init_replicas(app, engine_options):
+    """Create engines for REPLICA_DATABASE_URIS and enable read routing; no-op without replicas."""
+    uris = app.config['REPLICA_DATABASE_URIS']
+    if not uris:
+        return None
+    engines = [create_engine(uri, **engine_options(uri)) for uri in uris]
+    replicas = ReplicaSet(
+        engines,
+        app.config['REPLICA_READ_ENDPOINTS'],
+        sticky_seconds=app.config['REPLICA_STICKY_SECONDS'],
+        check_interval=app.config['REPLICA_CHECK_INTERVAL'],
+        max_lag=app.config['REPLICA_MAX_LAG']
+    )
+    app.extensions['replicas'] = replicas
+    app.after_request(_mark_sticky)
+    return replicas
@@ -0,0 +1,88 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from audit import audit_log
+from extensions import db
+from models import APIKey
+from usage import usage_tracker
+from utils import decrypt_key
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = 'API Key not found or unauthorized.'
+DECRYPT_FAILED = 'Decryption failed.'
+
+class TooManyKeys(ValueError):
+    pass
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor(workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reveal')
+    return _executor
+
+def _decrypt(stored):
+    try:
+        return decrypt_key(stored), None
+    except Exception as e:
+        return None, e
+
+def reveal_select(user_id, key_ids=None, category_id=None, limit=None):
+    """The user's keys selected by id or by category; one row past limit when selecting by category."""
+    statement = select(APIKey.id, APIKey.ciphertext, APIKey.encrypted_key).where(APIKey.user_id == user_id)
+    if key_ids is not None:
+        statement = statement.where(APIKey.id.in_(key_ids))
+    elif category_id == 0:
+        statement = statement.where(APIKey.category_id.is_(None))
+    else:
+        statement = statement.where(APIKey.category_id == category_id)
+    if limit is not None and key_ids is None:
+        statement = statement.order_by(APIKey.id).limit(limit + 1)
+    return statement
+
+def decrypt_rows(user_id, rows, key_ids=None, workers=4, limit=None, ip=None):
+    """Decrypt rows from reveal_select, then record the reveals for usage and the audit trail.
+
+    Shared by the WSGI and ASGI endpoints so both count and audit reveals
+    the same way. Pass ip when calling outside a Flask request.
+    """
+    if limit is not None and key_ids is None and len(rows) > limit:
+        raise TooManyKeys(f'At most {limit} keys can be revealed at once.')
+    if len(rows) == 1:
+        results = [_decrypt(rows[0].ciphertext or rows[0].encrypted_key)]
+    else:
+        results = get_executor(workers).map(_decrypt, [row.ciphertext or row.encrypted_key for row in rows])
+
+    revealed = {}
+    errors = {}
+    for row, (plaintext, error) in zip(rows, results):
+        if error is None:
+            revealed[row.id] = plaintext
+        else:
+            logger.error('Decryption failed for key_id %s: %s', row.id, error)
+            errors[row.id] = DECRYPT_FAILED
+    if key_ids is not None:
+        for key_id in key_ids:
+            if key_id not in revealed and key_id not in errors:
+                errors[key_id] = NOT_FOUND
+    if revealed:
+        usage_tracker.record(user_id, list(revealed))
+        audit_log.record('reveal', user_id, list(revealed), ip=ip)
+    return revealed, errors
+
+def reveal_keys(user_id, key_ids=None, category_id=None, workers=4, limit=None):
+    """Decrypt a set of a user's keys selected by id or by category.
+
+    Ownership is checked with a single IN query. Returns (revealed, errors),
+    both keyed by key id; ids that are missing or not owned by the user get
+    an error entry. Raises TooManyKeys if a category holds more than limit
+    keys, before anything is decrypted.
+    """
+    rows = db.session.execute(reveal_select(user_id, key_ids, category_id, limit)).all()
+    return decrypt_rows(user_id, rows, key_ids, workers, limit)
@@ -0,0 +1,132 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from extensions import db
+from models import APIKey, KeyRotationJob
+from utils import pack_token, rotate_tokens
+
+logger = logging.getLogger(__name__)
+
+def current_job(restart=False):
+    """Return the unfinished rotation job to resume, or start a new one."""
+    job = None if restart else KeyRotationJob.query.filter(KeyRotationJob.finished_at.is_(None)).order_by(KeyRotationJob.id.desc()).first()
+    if job is None:
+        job = KeyRotationJob(last_key_id=0, rotated_count=0)
+        db.session.add(job)
+        db.session.commit()
+    return job
+
+def _split(items, parts):
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _throttle(chunk_started, rows, rows_per_second):
+    if rows_per_second:
+        remaining = rows / rows_per_second - (time.monotonic() - chunk_started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+def rotate_all_keys(chunk_size=500, workers=2, rows_per_second=None, restart=False, progress=None):
+    """Re-encrypt every api_key row under the primary ENCRYPTION_KEY.
+
+    Rows are walked in id order, chunk_size at a time. Each chunk is
+    re-encrypted on a process pool and committed together with the job's
+    checkpoint, so an interrupted run resumes after the last committed id.
+    A row that changed after it was read (say the binary backfill packed
+    it) is read again and re-rotated before the checkpoint moves past it.
+    rows_per_second caps throughput so live traffic keeps its share of the
+    database.
+    """
+    job = current_job(restart)
+    logger.info('Key rotation job %s starting after key_id %s', job.id, job.last_key_id)
+    table = APIKey.__table__
+    # Rotated keys are written in the packed binary form, converting legacy rows on the way
+    statement = update(table) \
+        .where(table.c.id == bindparam('key_id'),
+               table.c.ciphertext.is_not_distinct_from(bindparam('old_ciphertext')),
+               table.c.encrypted_key.is_not_distinct_from(bindparam('old_key'))) \
+        .values(ciphertext=bindparam('new_ciphertext'), encrypted_key=None)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            chunk_started = time.monotonic()
+            rows = db.session.query(APIKey.id, APIKey.ciphertext, APIKey.encrypted_key) \
+                .filter(APIKey.id > job.last_key_id) \
+                .order_by(APIKey.id) \
+                .limit(chunk_size) \
+                .all()
+            if not rows:
+                break
+            pending = rows
+            while pending:
+                tokens = [row.ciphertext or row.encrypted_key for row in pending]
+                rotated = [token for part in executor.map(rotate_tokens, _split(tokens, workers)) for token in part]
+                # Matching on the old ciphertext leaves rows that changed since they were read untouched;
+                # executed one row at a time because executemany rowcounts are not reliable everywhere
+                missed = []
+                for row, new_ciphertext in zip(pending, rotated):
+                    if new_ciphertext is None:
+                        continue
+                    result = db.session.execute(statement, {
+                        'key_id': row.id, 'old_ciphertext': row.ciphertext, 'old_key': row.encrypted_key, 'new_ciphertext': new_ciphertext
+                    })
+                    if result.rowcount:
+                        job.rotated_count += 1
+                    else:
+                        missed.append(row.id)
+                # Deleted rows simply drop out here
+                pending = db.session.query(APIKey.id, APIKey.ciphertext, APIKey.encrypted_key) \
+                    .filter(APIKey.id.in_(missed)) \
+                    .order_by(APIKey.id) \
+                    .all() if missed else []
+            job.last_key_id = rows[-1].id
+            job.updated_at = datetime.utcnow()
+            db.session.commit()
+            if progress:
+                progress(job)
+            _throttle(chunk_started, len(rows), rows_per_second)
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    logger.info('Key rotation job %s finished; %s keys re-encrypted', job.id, job.rotated_count)
+    return job
+
+def backfill_binary_keys(chunk_size=1000, rows_per_second=None, progress=None):
+    """Move legacy base64 keys from encrypted_key into the packed ciphertext column.
+
+    Walks the rows that still have text in id order, chunk_size at a time,
+    committing each chunk. No decryption is needed, only re-encoding. The
+    job needs no checkpoint: converted rows drop out of its filter, so a
+    rerun picks up where an interrupted one stopped. Returns the number of
+    rows converted.
+    """
+    table = APIKey.__table__
+    statement = update(table) \
+        .where(table.c.id == bindparam('key_id'), table.c.encrypted_key == bindparam('old_key')) \
+        .values(ciphertext=bindparam('new_ciphertext'), encrypted_key=None)
+    last_key_id = 0
+    converted = 0
+    while True:
+        chunk_started = time.monotonic()
+        rows = db.session.query(APIKey.id, APIKey.encrypted_key) \
+            .filter(APIKey.id > last_key_id, APIKey.encrypted_key.isnot(None)) \
+            .order_by(APIKey.id) \
+            .limit(chunk_size) \
+            .all()
+        if not rows:
+            break
+        # Matching on the old text skips rows the rotation job rewrote since they were read; it packs them itself
+        db.session.execute(statement, [
+            {'key_id': row.id, 'old_key': row.encrypted_key, 'new_ciphertext': pack_token(row.encrypted_key)}
+            for row in rows
+        ])
+        db.session.commit()
+        last_key_id = rows[-1].id
+        converted += len(rows)
+        if progress:
+            progress(last_key_id, converted)
+        _throttle(chunk_started, len(rows), rows_per_second)
+    logger.info('Binary key backfill finished; %s keys converted', converted)
+    return converted
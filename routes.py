@@ -1,18 +1,44 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, g, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, Response, stream_with_context, session, abort
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import User, APIKey, Category
+from hashing import HashingBusy
+from user_cache import user_cache, remember_login, revoke_sessions
 from forms import RegistrationForm, LoginForm, AddAPIKeyForm, AddCategoryForm
-from app import db
-from utils import encrypt_key, decrypt_key
+from extensions import db
+from utils import encrypt_key
 import logging
-import traceback
 from sqlalchemy.exc import SQLAlchemyError
-import os
+from bulk_import import import_file
+from backup import export_lines, restore_file, check_passphrase, BackupError
+from reveal import reveal_keys, TooManyKeys, DECRYPT_FAILED
+from search import search_wallet, DEFAULT_LIMIT, MAX_LIMIT
+from rate_limit import throttle_decrypts
+from audit import audit_log, history_select, serialize_event, encode_cursor as encode_audit_cursor, InvalidCursor as InvalidAuditCursor
+from bulk_keys import move_keys, delete_keys, delete_category as delete_category_and_keys, CategoryNotFound
+from fragments import wallet_fragments
+from markupsafe import Markup
+from queries import group_keys_by_category, serialize_key, first_pages, next_page, wallet_versions_select, wallet_stamp, InvalidCursor, SORTS
 
 main = Blueprint('main', __name__)
 auth = Blueprint('auth', __name__)
 
+def requested_page_size():
+    default = current_app.config.get('WALLET_PAGE_SIZE', 50)
+    maximum = current_app.config.get('WALLET_MAX_PAGE_SIZE', 200)
+    page_size = request.args.get('page_size', default, type=int)
+    return max(1, min(page_size, maximum))
+
+def requested_sort():
+    sort = request.args.get('sort', 'name')
+    return sort if sort in SORTS else 'name'
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -28,7 +54,11 @@ def register():
             return redirect(url_for('auth.register'))
         
         new_user = User(email=email)
-        new_user.set_password(password)
+        try:
+            new_user.set_password(password)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('register.html', form=form), 503
         db.session.add(new_user)
         db.session.commit()
         
@@ -50,33 +80,67 @@ def login():
         try:
             user = User.query.filter_by(email=email).first()
             if user and user.check_password(password):
+                if user.password_needs_rehash():
+                    upgrade_password_hash(user, password)
                 login_user(user)
+                remember_login(user)
                 return redirect(url_for('main.wallet'))
             else:
                 flash('Invalid email or password.', 'danger')
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('login.html', form=form), 503
         except SQLAlchemyError as e:
-            current_app.logger.error(f"Database error during login: {str(e)}")
+            current_app.logger.error("Database error during login: %s", e)
             flash('An error occurred while processing your request. Please try again later.', 'danger')
         except Exception as e:
-            current_app.logger.error(f"Unexpected error during login: {str(e)}")
+            current_app.logger.error("Unexpected error during login: %s", e)
             flash('An unexpected error occurred. Please try again later.', 'danger')
     
     return render_template('login.html', form=form)
 
+def upgrade_password_hash(user, password):
+    # Best effort: a busy hasher or failed write just leaves the old hash for next time
+    try:
+        user.set_password(password)
+        db.session.commit()
+        user_cache.invalidate(user.id)
+    except HashingBusy:
+        current_app.logger.info("Skipped password rehash for user %s: hasher busy", user.id)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error("Database error during password rehash: %s", e)
+
 @auth.route('/logout')
 @login_required
 def logout():
     try:
+        user_cache.invalidate(current_user.id)
+        session.pop('_auth_stamp', None)
         logout_user()
         flash('You have been logged out successfully.', 'success')
     except SQLAlchemyError as e:
-        current_app.logger.error(f"Database error during logout: {str(e)}")
+        current_app.logger.error("Database error during logout: %s", e)
         flash('An error occurred during logout. Please try again.', 'danger')
     except Exception as e:
-        current_app.logger.error(f"Unexpected error during logout: {str(e)}")
+        current_app.logger.error("Unexpected error during logout: %s", e)
         flash('An unexpected error occurred. Please try again.', 'danger')
     return redirect(url_for('main.index'))
 
+@auth.route('/logout_everywhere', methods=['POST'])
+@login_required
+def logout_everywhere():
+    try:
+        revoke_sessions(current_user)
+        session.pop('_auth_stamp', None)
+        logout_user()
+        flash('You have been logged out of every session.', 'success')
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error("Database error during logout everywhere: %s", e)
+        flash('An error occurred during logout. Please try again.', 'danger')
+    return redirect(url_for('main.index'))
+
 @main.route('/')
 def index():
     return render_template('landing.html')
@@ -86,43 +150,34 @@ def index():
 @login_required
 def wallet(category_id=None):
     try:
-        current_app.logger.info(f"Fetching API keys for user {current_user.id}")
-        categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
-        
-        if category_id == 0:  # Uncategorized
-            api_keys = APIKey.query.filter_by(user_id=current_user.id, category_id=None).all()
-        elif category_id:
-            api_keys = APIKey.query.filter_by(user_id=current_user.id, category_id=category_id).all()
-        else:
-            api_keys = APIKey.query.filter_by(user_id=current_user.id).all()
-        
-        api_keys = sorted(api_keys, key=lambda x: x.key_name.lower())
-        
-        grouped_keys = {category.name: [] for category in categories}
-        grouped_keys['Uncategorized'] = []
-        
-        for key in api_keys:
-            if key.category:
-                grouped_keys[key.category.name].append(key)
-            else:
-                grouped_keys['Uncategorized'].append(key)
-        
-        for category in grouped_keys:
-            grouped_keys[category] = sorted(grouped_keys[category], key=lambda x: x.key_name.lower())
-        
-        display_grouped_keys = {k: v for k, v in grouped_keys.items() if v}
-        
-        for category, keys in display_grouped_keys.items():
-            current_app.logger.info(f"Category '{category}' has {len(keys)} keys")
-        
-        current_app.logger.info("Rendering wallet template with Add New API Key button")
-        return render_template('wallet.html', grouped_keys=display_grouped_keys, all_categories=categories, current_category_id=category_id, debug=current_app.debug, show_add_key_button=True)
+        current_app.logger.info("Fetching API keys for user %s", current_user.id)
+        page_size = requested_page_size()
+        sort = requested_sort()
+        # The body only changes when its version stamp does, so a hit costs this one lookup
+        stamp = wallet_stamp(db.session.execute(wallet_versions_select(current_user.id)).first(), sort)
+        key = wallet_fragments.key('wallet', current_user.id, stamp, category_id, page_size, sort, current_app.debug)
+        wallet_body = wallet_fragments.get_or_render(key, lambda: render_wallet_body(category_id, page_size, sort))
+        return render_template('wallet.html', wallet_body=Markup(wallet_body))
     except Exception as e:
-        current_app.logger.error(f"Error in wallet route: {str(e)}")
-        current_app.logger.error(traceback.format_exc())
+        current_app.logger.error("Error in wallet route: %s", e, exc_info=True)
         flash('An error occurred while retrieving your wallet. Please try again later.', 'danger')
         return redirect(url_for('main.index'))
 
+def render_wallet_body(category_id, page_size, sort='name'):
+    categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
+    
+    api_keys, next_cursors = first_pages(current_user.id, page_size, category_id, sort)
+    grouped_keys = group_keys_by_category(api_keys, categories)
+    
+    display_grouped_keys = {k: v for k, v in grouped_keys.items() if v}
+    
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        for category, keys in display_grouped_keys.items():
+            current_app.logger.debug("Category '%s' has %s keys", category, len(keys))
+    
+    current_app.logger.debug("Rendering wallet template with Add New API Key button")
+    return render_template('wallet_body.html', grouped_keys=display_grouped_keys, next_cursors=next_cursors, all_categories=categories, current_category_id=category_id, current_sort=sort, debug=current_app.debug, show_add_key_button=True)
+
 @main.route('/add_key', methods=['GET', 'POST'])
 @login_required
 def add_key():
@@ -132,17 +187,21 @@ def add_key():
     
     if form.validate_on_submit():
         try:
-            current_app.logger.debug(f"Form data: key_name={form.key_name.data}, category={form.category.data}")
+            current_app.logger.debug("Form data: key_name=%s, category=%s", form.key_name.data, form.category.data)
             
-            encrypted_key = encrypt_key(form.api_key.data)
+            ciphertext = encrypt_key(form.api_key.data)
             new_key = APIKey(
                 user_id=current_user.id,
                 key_name=form.key_name.data,
-                encrypted_key=encrypted_key,
+                ciphertext=ciphertext,
                 category_id=form.category.data if form.category.data != 0 else None
             )
             db.session.add(new_key)
+            User.bump_wallet_version(current_user.id)
+            # Read before the commit expires current_user
+            user_id = current_user.id
             db.session.commit()
+            audit_log.record('add', user_id, [new_key.id])
             
             category = Category.query.get(new_key.category_id) if new_key.category_id else None
             return jsonify({
@@ -157,11 +216,11 @@ def add_key():
             }), 200
         except SQLAlchemyError as e:
             db.session.rollback()
-            current_app.logger.error(f"Database error in add_key route: {str(e)}")
+            current_app.logger.error("Database error in add_key route: %s", e)
             return jsonify({'success': False, 'error': 'An error occurred while adding the API key. Please try again.'}), 500
         except Exception as e:
             db.session.rollback()
-            current_app.logger.error(f"Unexpected error in add_key route: {str(e)}")
+            current_app.logger.error("Unexpected error in add_key route: %s", e)
             return jsonify({'success': False, 'error': 'An unexpected error occurred. Please try again.'}), 500
     
     if request.method == 'GET':
@@ -171,36 +230,26 @@ def add_key():
 
 @main.route('/copy_key/<int:key_id>', methods=['POST'])
 @login_required
+@throttle_decrypts
 def copy_key(key_id):
-    try:
-        current_app.logger.info(f"Copy key request received for key_id: {key_id}")
-        api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first()
-        if not api_key:
-            current_app.logger.warning(f"API key not found or unauthorized for key_id: {key_id}")
-            return jsonify({'error': 'API key not found or unauthorized'}), 403
-        current_app.logger.info(f"API key found for key_id: {key_id}")
-        decrypted_key = decrypt_key(api_key.encrypted_key)
-        current_app.logger.info(f"API key successfully decrypted for key_id: {key_id}")
-        return jsonify({'key': decrypted_key})
-    except Exception as e:
-        current_app.logger.error(f'Error in copy_key route: {str(e)}')
-        current_app.logger.error(traceback.format_exc())
-        return jsonify({'error': 'An error occurred while processing the request'}), 500
+    return reveal_single_key(key_id, 'copy_key', not_found_status=403)
 
 @main.route('/delete_key/<int:key_id>', methods=['POST'])
 @login_required
 def delete_key(key_id):
     try:
-        api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first()
-        if api_key:
-            db.session.delete(api_key)
+        deleted = delete_keys(current_user.id, key_ids=[key_id])
+        if deleted:
+            User.bump_wallet_version(current_user.id)
+            user_id = current_user.id
             db.session.commit()
+            audit_log.record('delete', user_id, deleted)
             return jsonify({'success': True, 'message': 'API Key deleted successfully.'}), 200
         else:
             return jsonify({'success': False, 'error': 'API Key not found or unauthorized.'}), 404
     except SQLAlchemyError as e:
         db.session.rollback()
-        current_app.logger.error(f'Database error in delete_key route: {str(e)}')
+        current_app.logger.error('Database error in delete_key route: %s', e)
         return jsonify({'success': False, 'error': 'An error occurred while deleting the API key.'}), 500
 
 @main.route('/add_category', methods=['GET', 'POST'])
@@ -211,12 +260,13 @@ def add_category():
         try:
             new_category = Category(name=form.name.data, user_id=current_user.id)
             db.session.add(new_category)
+            User.bump_wallet_version(current_user.id)
             db.session.commit()
             flash('Category added successfully.', 'success')
             return redirect(url_for('main.wallet'))
         except SQLAlchemyError as e:
             db.session.rollback()
-            current_app.logger.error(f'Database error in add_category route: {str(e)}')
+            current_app.logger.error('Database error in add_category route: %s', e)
             flash('An error occurred while adding the category. Please try again later.', 'danger')
     return render_template('add_category.html', form=form)
 
@@ -225,25 +275,83 @@ def add_category():
 def update_key_category(key_id):
     try:
         category_id = request.json.get('category_id')
-        api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first()
-        if api_key:
-            if category_id == 0:
-                api_key.category_id = None
-                category_name = 'Uncategorized'
-            else:
-                category = Category.query.get(category_id)
-                if not category:
-                    return jsonify({'success': False, 'error': 'Category not found.'}), 404
-                api_key.category_id = category_id
-                category_name = category.name
+        moved, category_name = move_keys(current_user.id, category_id, key_ids=[key_id])
+        if moved:
+            User.bump_wallet_version(current_user.id)
+            user_id = current_user.id
             db.session.commit()
+            audit_log.record('edit', user_id, moved)
             return jsonify({'success': True, 'message': 'Category updated successfully.', 'category_name': category_name}), 200
         return jsonify({'success': False, 'error': 'API Key not found or unauthorized.'}), 404
+    except CategoryNotFound:
+        return jsonify({'success': False, 'error': 'Category not found.'}), 404
     except SQLAlchemyError as e:
         db.session.rollback()
-        current_app.logger.error(f'Database error in update_key_category route: {str(e)}')
+        current_app.logger.error('Database error in update_key_category route: %s', e)
         return jsonify({'success': False, 'error': 'An error occurred while updating the category.'}), 500
 
+def bulk_selection(data, category_field):
+    """Read key_ids or category_field from a bulk request body; returns (key_ids, category_id, error)."""
+    key_ids = data.get('key_ids')
+    category_id = data.get(category_field)
+    if key_ids is None and category_id is None:
+        return None, None, f'key_ids or {category_field} is required.'
+    if key_ids is not None:
+        if not isinstance(key_ids, list) or not all(isinstance(key_id, int) for key_id in key_ids):
+            return None, None, 'key_ids must be a list of integers.'
+        if len(key_ids) > current_app.config['BULK_MAX_KEYS']:
+            return None, None, f"At most {current_app.config['BULK_MAX_KEYS']} keys can be changed at once."
+        return list(dict.fromkeys(key_ids)), None, None
+    if not isinstance(category_id, int):
+        return None, None, f'{category_field} must be an integer.'
+    return None, category_id, None
+
+@main.route('/move_keys', methods=['POST'])
+@login_required
+def move_keys_bulk():
+    data = request.get_json(silent=True) or {}
+    key_ids, from_category_id, error = bulk_selection(data, 'from_category_id')
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    category_id = data.get('category_id')
+    if not isinstance(category_id, int):
+        return jsonify({'success': False, 'error': 'category_id must be an integer.'}), 400
+    try:
+        moved, category_name = move_keys(current_user.id, category_id, key_ids=key_ids, from_category_id=from_category_id)
+        if moved:
+            User.bump_wallet_version(current_user.id)
+        user_id = current_user.id
+        db.session.commit()
+        if moved:
+            audit_log.record('edit', user_id, moved)
+        return jsonify({'success': True, 'moved': len(moved), 'category_name': category_name}), 200
+    except CategoryNotFound:
+        return jsonify({'success': False, 'error': 'Category not found.'}), 404
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error('Database error in move_keys route: %s', e)
+        return jsonify({'success': False, 'error': 'An error occurred while moving the API keys.'}), 500
+
+@main.route('/delete_keys', methods=['POST'])
+@login_required
+def delete_keys_bulk():
+    key_ids, category_id, error = bulk_selection(request.get_json(silent=True) or {}, 'category_id')
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    try:
+        deleted = delete_keys(current_user.id, key_ids=key_ids, category_id=category_id)
+        if deleted:
+            User.bump_wallet_version(current_user.id)
+        user_id = current_user.id
+        db.session.commit()
+        if deleted:
+            audit_log.record('delete', user_id, deleted)
+        return jsonify({'success': True, 'deleted': len(deleted)}), 200
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error('Database error in delete_keys route: %s', e)
+        return jsonify({'success': False, 'error': 'An error occurred while deleting the API keys.'}), 500
+
 @main.route('/manage_categories')
 @login_required
 def manage_categories():
@@ -258,27 +366,38 @@ def edit_category(category_id):
     if form.validate_on_submit():
         try:
             category.name = form.name.data
+            User.bump_wallet_version(current_user.id)
             db.session.commit()
             flash('Category updated successfully.', 'success')
             return redirect(url_for('main.manage_categories'))
         except SQLAlchemyError as e:
             db.session.rollback()
-            current_app.logger.error(f'Database error in edit_category route: {str(e)}')
+            current_app.logger.error('Database error in edit_category route: %s', e)
             flash('An error occurred while updating the category. Please try again later.', 'danger')
     return render_template('edit_category.html', form=form, category=category)
 
 @main.route('/delete_category/<int:category_id>', methods=['POST'])
 @login_required
 def delete_category(category_id):
+    # Keys move to Uncategorized unless the form asks for them to be deleted too
+    delete_contents = request.form.get('keys') == 'delete'
     try:
-        category = Category.query.filter_by(id=category_id, user_id=current_user.id).first_or_404()
-        db.session.delete(category)
+        affected = delete_category_and_keys(current_user.id, category_id, delete_contents=delete_contents)
+        User.bump_wallet_version(current_user.id)
+        user_id = current_user.id
         db.session.commit()
-        flash('Category deleted successfully.', 'success')
+        if affected:
+            audit_log.record('delete' if delete_contents else 'edit', user_id, affected)
+        if delete_contents:
+            flash(f'Category and its {len(affected)} API key(s) deleted successfully.', 'success')
+        else:
+            flash(f'Category deleted successfully; {len(affected)} API key(s) moved to Uncategorized.', 'success')
         return redirect(url_for('main.manage_categories'))
+    except CategoryNotFound:
+        abort(404)
     except SQLAlchemyError as e:
         db.session.rollback()
-        current_app.logger.error(f'Database error in delete_category route: {str(e)}')
+        current_app.logger.error('Database error in delete_category route: %s', e)
         flash('An error occurred while deleting the category. Please try again later.', 'danger')
         return redirect(url_for('main.manage_categories'))
 
@@ -291,7 +410,10 @@ def edit_key(key_id):
             new_name = request.json.get('key_name')
             if new_name:
                 api_key.key_name = new_name
+                User.bump_wallet_version(current_user.id)
+                user_id = current_user.id
                 db.session.commit()
+                audit_log.record('edit', user_id, [key_id])
                 return jsonify({'success': True, 'message': 'API Key name updated successfully.', 'new_name': new_name}), 200
             else:
                 return jsonify({'success': False, 'error': 'New key name is required.'}), 400
@@ -299,53 +421,193 @@ def edit_key(key_id):
             return jsonify({'success': False, 'error': 'API Key not found or unauthorized.'}), 404
     except SQLAlchemyError as e:
         db.session.rollback()
-        current_app.logger.error(f'Database error in edit_key route: {str(e)}')
+        current_app.logger.error('Database error in edit_key route: %s', e)
         return jsonify({'success': False, 'error': 'An error occurred while updating the API key name.'}), 500
 
 @main.route('/get_key/<int:key_id>', methods=['POST'])
 @login_required
+@throttle_decrypts
 def get_key(key_id):
+    return reveal_single_key(key_id, 'get_key', not_found_status=404)
+
+def reveal_single_key(key_id, route_name, not_found_status):
     try:
-        api_key = APIKey.query.filter_by(id=key_id, user_id=current_user.id).first()
-        if api_key:
-            decrypted_key = decrypt_key(api_key.encrypted_key)
-            return jsonify({'key': decrypted_key}), 200
-        else:
-            return jsonify({'error': 'API Key not found or unauthorized.'}), 404
+        revealed, errors = reveal_keys(current_user.id, key_ids=[key_id], workers=current_app.config['REVEAL_WORKERS'])
+        if key_id in revealed:
+            return jsonify({'key': revealed[key_id]}), 200
+        if errors.get(key_id) == DECRYPT_FAILED:
+            return jsonify({'error': 'An error occurred while processing the request'}), 500
+        current_app.logger.warning("API key not found or unauthorized for key_id: %s", key_id)
+        return jsonify({'error': 'API Key not found or unauthorized.'}), not_found_status
+    except Exception as e:
+        current_app.logger.error('Error in %s route: %s', route_name, e, exc_info=True)
+        return jsonify({'error': 'An error occurred while processing the request'}), 500
+
+@main.route('/reveal_keys', methods=['POST'])
+@login_required
+@throttle_decrypts
+def reveal_keys_batch():
+    data = request.get_json(silent=True) or {}
+    key_ids = data.get('key_ids')
+    category_id = data.get('category_id')
+    if key_ids is None and category_id is None:
+        return jsonify({'error': 'key_ids or category_id is required.'}), 400
+    if key_ids is not None:
+        if not isinstance(key_ids, list) or not all(isinstance(key_id, int) for key_id in key_ids):
+            return jsonify({'error': 'key_ids must be a list of integers.'}), 400
+        if len(key_ids) > current_app.config['REVEAL_MAX_KEYS']:
+            return jsonify({'error': f"At most {current_app.config['REVEAL_MAX_KEYS']} keys can be revealed at once."}), 400
+        key_ids = list(dict.fromkeys(key_ids))
+    elif not isinstance(category_id, int):
+        return jsonify({'error': 'category_id must be an integer.'}), 400
+    try:
+        revealed, errors = reveal_keys(
+            current_user.id, key_ids=key_ids, category_id=category_id,
+            workers=current_app.config['REVEAL_WORKERS'], limit=current_app.config['REVEAL_MAX_KEYS']
+        )
+        return jsonify({'keys': revealed, 'errors': errors}), 200
+    except TooManyKeys as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        current_app.logger.error(f'Error in get_key route: {str(e)}')
-        return jsonify({'error': 'An error occurred while retrieving the API key.'}), 500
+        current_app.logger.error('Error in reveal_keys route: %s', e, exc_info=True)
+        return jsonify({'error': 'An error occurred while processing the request'}), 500
 
 @main.route('/get_categories_and_keys')
 @login_required
 def get_categories_and_keys():
     try:
-        categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
-        api_keys = APIKey.query.filter_by(user_id=current_user.id).order_by(APIKey.key_name).all()
+        # current_user may be a cached snapshot, so the version is read fresh; a 304 costs only this lookup
+        page_size = requested_page_size()
+        sort = requested_sort()
+        stamp = wallet_stamp(db.session.execute(wallet_versions_select(current_user.id)).first(), sort)
+        etag = f'wallet-{current_user.id}-{stamp}-{page_size}-{sort}'
+        if etag in request.if_none_match:
+            return not_modified(etag)
         
-        grouped_keys = {category.name: [] for category in categories}
-        grouped_keys['Uncategorized'] = []
-        
-        for key in api_keys:
-            if key.category:
-                grouped_keys[key.category.name].append({
-                    'id': key.id,
-                    'key_name': key.key_name,
-                    'category_id': key.category_id,
-                    'date_added': key.date_added.isoformat()
-                })
-            else:
-                grouped_keys['Uncategorized'].append({
-                    'id': key.id,
-                    'key_name': key.key_name,
-                    'category_id': None,
-                    'date_added': key.date_added.isoformat()
-                })
+        categories = Category.query.filter_by(user_id=current_user.id).order_by(Category.name).all()
+        api_keys, next_cursors = first_pages(current_user.id, page_size, sort=sort)
+        grouped_keys = group_keys_by_category(api_keys, categories, serialize=lambda key: serialize_key(key, sort))
         
-        return jsonify({
+        response = jsonify({
             'categories': [{'id': c.id, 'name': c.name} for c in categories],
-            'grouped_keys': grouped_keys
+            'grouped_keys': grouped_keys,
+            'next_cursors': next_cursors
+        })
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response, 200
+    except Exception as e:
+        current_app.logger.error("Error in get_categories_and_keys route: %s", e)
+        return jsonify({'error': 'An error occurred while fetching categories and keys.'}), 500
+
+@main.route('/get_keys_page')
+@login_required
+def get_keys_page():
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return jsonify({'error': 'A cursor is required.'}), 400
+    try:
+        api_keys, next_cursor, sort = next_page(current_user.id, cursor, requested_page_size())
+        return jsonify({
+            'keys': [serialize_key(key, sort) for key in api_keys],
+            'next_cursor': next_cursor
+        }), 200
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    except Exception as e:
+        current_app.logger.error("Error in get_keys_page route: %s", e)
+        return jsonify({'error': 'An error occurred while fetching API keys.'}), 500
+
+@main.route('/import_keys', methods=['POST'])
+@login_required
+def import_keys():
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'error': 'A CSV or JSON Lines file is required.'}), 400
+    fmt = request.form.get('format')
+    if fmt and fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'error': 'Format must be csv or jsonl.'}), 400
+    try:
+        # Uploads are spooled to disk by werkzeug and read back row by row
+        result = import_file(
+            current_user.id, upload.stream, filename=upload.filename, fmt=fmt,
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+            workers=current_app.config['IMPORT_WORKERS']
+        )
+        return jsonify({'success': True, **result.to_dict()}), 200
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'The file must be UTF-8 encoded.'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Unexpected error in import_keys route: %s", e)
+        return jsonify({'success': False, 'error': 'An unexpected error occurred during import.'}), 500
+
+@main.route('/export_keys', methods=['POST'])
+@login_required
+def export_keys():
+    passphrase = request.form.get('passphrase', '')
+    try:
+        check_passphrase(passphrase)
+    except BackupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    # stream_with_context keeps the session and its server-side cursor open while the body is sent
+    lines = export_lines(current_user.id, passphrase, chunk_size=current_app.config['EXPORT_CHUNK_SIZE'])
+    response = Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=keyguardian-backup.jsonl'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main.route('/restore_keys', methods=['POST'])
+@login_required
+def restore_keys():
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'error': 'A backup file is required.'}), 400
+    try:
+        result = restore_file(
+            current_user.id, upload.stream, request.form.get('passphrase', ''),
+            batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+            workers=current_app.config['IMPORT_WORKERS']
+        )
+        return jsonify({'success': True, **result.to_dict()}), 200
+    except BackupError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'The file is not a KeyGuardian backup.'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Unexpected error in restore_keys route: %s", e)
+        return jsonify({'success': False, 'error': 'An unexpected error occurred during restore.'}), 500
+
+@main.route('/search')
+@login_required
+def search():
+    term = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+    try:
+        keys, categories = search_wallet(current_user.id, term, limit)
+        return jsonify({'keys': keys, 'categories': categories}), 200
+    except Exception as e:
+        current_app.logger.error("Error in search route: %s", e)
+        return jsonify({'error': 'An error occurred while searching.'}), 500
+
+@main.route('/audit_events')
+@login_required
+def audit_events():
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    try:
+        events = db.session.execute(history_select(
+            current_user.id, key_id=request.args.get('key_id', type=int), cursor=request.args.get('cursor'), limit=limit
+        )).all()
+        return jsonify({
+            'events': [serialize_event(event) for event in events],
+            'next_cursor': encode_audit_cursor(events[-1]) if len(events) == limit else None
         }), 200
+    except InvalidAuditCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
     except Exception as e:
-        current_app.logger.error(f"Error in get_categories_and_keys route: {str(e)}")
-        return jsonify({'error': 'An error occurred while fetching categories and keys.'}), 500
\ No newline at end of file
+        current_app.logger.error("Error in audit_events route: %s", e)
+        return jsonify({'error': 'An error occurred while fetching audit events.'}), 500
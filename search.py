@@ -0,0 +1,132 @@
+import bisect
+import heapq
+import threading
+from sqlalchemy import case, func
+from cache import TTLCache
+from extensions import db
+from models import User, APIKey, Category
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+def _like_escape(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _serialize_key(key_id, key_name, category_id, category_name):
+    return {
+        'id': key_id,
+        'key_name': key_name,
+        'category_id': category_id,
+        'category_name': category_name or 'Uncategorized'
+    }
+
+def search_database(user_id, term, limit):
+    """Rank matches in SQL; on Postgres the LIKEs are served by the pg_trgm indexes."""
+    escaped = _like_escape(term)
+    contains, prefix = f'%{escaped}%', f'{escaped}%'
+
+    lower_key_name = func.lower(APIKey.key_name)
+    keys = db.session.query(APIKey.id, APIKey.key_name, APIKey.category_id, Category.name) \
+        .outerjoin(Category, APIKey.category_id == Category.id) \
+        .filter(APIKey.user_id == user_id, lower_key_name.like(contains, escape='\\')) \
+        .order_by(case((lower_key_name.like(prefix, escape='\\'), 0), else_=1), func.length(APIKey.key_name), lower_key_name, APIKey.id) \
+        .limit(limit) \
+        .all()
+
+    lower_category_name = func.lower(Category.name)
+    categories = db.session.query(Category.id, Category.name) \
+        .filter(Category.user_id == user_id, lower_category_name.like(contains, escape='\\')) \
+        .order_by(case((lower_category_name.like(prefix, escape='\\'), 0), else_=1), func.length(Category.name), lower_category_name, Category.id) \
+        .limit(limit) \
+        .all()
+
+    return [_serialize_key(*key) for key in keys], [{'id': c.id, 'name': c.name} for c in categories]
+
+class NameList:
+    """Sorted lowercase names plus one newline-joined copy for C-speed substring scans."""
+
+    def __init__(self, names):
+        self.names = names
+        self.offsets = []
+        position = 0
+        for name in names:
+            self.offsets.append(position)
+            position += len(name) + 1
+        self.haystack = '\n'.join(names)
+
+    def prefix_range(self, term):
+        start = bisect.bisect_left(self.names, term)
+        return start, bisect.bisect_left(self.names, term + '\uffff', lo=start)
+
+    def containing(self, term):
+        """Yield the index of every name containing term, each once."""
+        position = self.haystack.find(term)
+        while position != -1:
+            index = bisect.bisect_right(self.offsets, position) - 1
+            yield index
+            if index + 1 >= len(self.offsets):
+                return
+            position = self.haystack.find(term, self.offsets[index + 1])
+
+class UserSearchIndex:
+    """Sorted in-memory name index for one user's wallet at one wallet_version."""
+
+    def __init__(self, user_id, version):
+        self.version = version
+        rows = db.session.query(APIKey.id, APIKey.key_name, APIKey.category_id).filter(APIKey.user_id == user_id).all()
+        self.category_names = dict(db.session.query(Category.id, Category.name).filter(Category.user_id == user_id).all())
+        self.keys = sorted((key_name.lower(), key_id, key_name, category_id) for key_id, key_name, category_id in rows)
+        self.key_names = NameList([entry[0] for entry in self.keys])
+        self.categories = sorted((name.lower(), category_id, name) for category_id, name in self.category_names.items())
+        self.category_names_list = NameList([entry[0] for entry in self.categories])
+
+    @staticmethod
+    def _ranked(entries, names, term, limit):
+        # Prefix matches are a contiguous slice of the sorted names and always outrank substring matches
+        start, end = names.prefix_range(term)
+        rank = lambda entry: (len(entry[0]), entry[0], entry[1])
+        matches = heapq.nsmallest(limit, entries[start:end], key=rank)
+        if len(matches) < limit:
+            others = (entries[i] for i in names.containing(term) if not start <= i < end)
+            matches += heapq.nsmallest(limit - len(matches), others, key=rank)
+        return matches
+
+    def search(self, term, limit):
+        keys = [
+            _serialize_key(key_id, key_name, category_id, self.category_names.get(category_id))
+            for _, key_id, key_name, category_id in self._ranked(self.keys, self.key_names, term, limit)
+        ]
+        categories = [
+            {'id': category_id, 'name': name}
+            for _, category_id, name in self._ranked(self.categories, self.category_names_list, term, limit)
+        ]
+        return keys, categories
+
+search_indexes = TTLCache(max_entries=256, ttl=300)
+_build_lock = threading.Lock()
+
+def search_memory(user_id, term, limit):
+    # wallet_version goes up on every key or category write, so a stale index is never used
+    version = db.session.query(User.wallet_version).filter_by(id=user_id).scalar()
+    index = search_indexes.get(user_id)
+    if index is None or index.version != version:
+        with _build_lock:
+            index = search_indexes.get(user_id)
+            if index is None or index.version != version:
+                index = UserSearchIndex(user_id, version)
+                search_indexes.set(user_id, index)
+    return index.search(term, limit)
+
+def search_wallet(user_id, term, limit=DEFAULT_LIMIT):
+    """Case-insensitive prefix and substring search over a user's key and category names.
+
+    Returns (keys, categories), each capped at limit and ranked prefix
+    matches first, then shorter names, then alphabetically.
+    """
+    # Newlines would let a substring match span two names in the in-memory index
+    term = ' '.join(term.split()).lower()
+    if not term:
+        return [], []
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return search_database(user_id, term, limit)
+    return search_memory(user_id, term, limit)
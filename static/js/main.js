@@ -14,5 +14,75 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Rest of the existing code...
+    // Load further pages of a category's keys as its carousel scrolls into view
+    const keyTemplate = document.getElementById('api-key-template');
+    const categoryGroups = document.querySelectorAll('.category-group[data-next-cursor]');
+
+    function renderKey(key) {
+        const card = keyTemplate.content.firstElementChild.cloneNode(true);
+        card.dataset.categoryId = key.category_id || 'uncategorized';
+        card.querySelector('h4').textContent = key.key_name;
+        card.querySelectorAll('[title]').forEach(button => {
+            button.dataset.keyId = key.id;
+        });
+        const select = card.querySelector('.category-select');
+        select.dataset.keyId = key.id;
+        select.value = key.category_id || 0;
+        card.querySelector('.date-added').textContent = 'Added on: ' + key.date_added.replace('T', ' ').slice(0, 19);
+        // Usage figures only come with the last_used sort
+        const lastUsed = card.querySelector('.last-used');
+        if (!('reveal_count' in key)) {
+            lastUsed.remove();
+        } else {
+            lastUsed.textContent = key.last_accessed
+                ? 'Last used: ' + key.last_accessed.replace('T', ' ').slice(0, 19) + ' (' + key.reveal_count + (key.reveal_count === 1 ? ' reveal)' : ' reveals)')
+                : 'Never used';
+        }
+        return card;
+    }
+
+    function loadNextPage(group, sentinel, observer) {
+        const cursor = group.dataset.nextCursor;
+        if (!cursor || group.dataset.loading) {
+            return;
+        }
+        group.dataset.loading = 'true';
+        fetch('/get_keys_page?cursor=' + encodeURIComponent(cursor))
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                data.keys.forEach(key => {
+                    sentinel.before(renderKey(key));
+                });
+                group.dataset.nextCursor = data.next_cursor || '';
+                // Re-observing fires again right away if the sentinel is still visible
+                observer.unobserve(sentinel);
+                if (data.next_cursor) {
+                    observer.observe(sentinel);
+                }
+            })
+            .catch(error => {
+                console.error('Error loading API keys:', error);
+            })
+            .finally(() => {
+                delete group.dataset.loading;
+            });
+    }
+
+    if (keyTemplate && 'IntersectionObserver' in window) {
+        categoryGroups.forEach(group => {
+            const sentinel = group.querySelector('.load-more-sentinel');
+            if (!group.dataset.nextCursor || !sentinel) {
+                return;
+            }
+            const observer = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) {
+                    loadNextPage(group, sentinel, observer);
+                }
+            }, { rootMargin: '200px' });
+            observer.observe(sentinel);
+        });
+    }
 });
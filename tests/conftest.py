@@ -0,0 +1,98 @@
+import os
+import pytest
+from cryptography.fernet import Fernet
+
+os.environ.setdefault('ENCRYPTION_KEY', Fernet.generate_key().decode())
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('APP_ENV', 'production')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+PASSWORD = 'test-password'
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from extensions import db
+    from search import search_indexes
+    from user_cache import user_cache
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'WTF_CSRF_ENABLED': False,
+        'RATE_LIMIT_ENABLED': False,
+        'USAGE_TRACKING_ENABLED': False,
+        'AUDIT_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+    })
+    # Module-level caches outlive the app; ids restart in every test database
+    user_cache.clear()
+    search_indexes.clear()
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/register', data={'email': 'user@example.com', 'password': PASSWORD, 'confirm_password': PASSWORD})
+    client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+    return client
+
+@pytest.fixture
+def user_id(app, client):
+    from models import User
+    with app.app_context():
+        return User.query.filter_by(email='user@example.com').one().id
+
+class QueryCounter:
+    """Counts statements sent on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+@pytest.fixture
+def count_queries(app):
+    from extensions import db
+    with app.app_context():
+        engine = db.engine
+    return lambda: QueryCounter(engine)
+
+@pytest.fixture
+def seed_keys(app, user_id):
+    """Insert count keys for the test user, spread over Uncategorized and `categories` categories."""
+    def seed(count, categories=3):
+        from sqlalchemy import insert
+        from extensions import db
+        from models import APIKey, Category
+        from utils import encrypt_key
+        with app.app_context():
+            category_rows = [Category(name=f'Category {i}', user_id=user_id) for i in range(categories)]
+            db.session.add_all(category_rows)
+            db.session.flush()
+            category_ids = [None] + [category.id for category in category_rows]
+            ciphertext = encrypt_key('secret')
+            db.session.execute(insert(APIKey), [
+                {'user_id': user_id, 'key_name': f'Key {i:04d}', 'ciphertext': ciphertext, 'category_id': category_ids[i % len(category_ids)]}
+                for i in range(count)
+            ])
+            db.session.commit()
+            return category_ids[1:]
+    return seed
@@ -0,0 +1,69 @@
+import asyncio
+import httpx
+import pytest
+from conftest import PASSWORD
+from async_api import create_asgi_app
+from audit import audit_log
+from backends import MemoryBackend
+from extensions import db
+from models import APIKey, AuditEvent
+from rate_limit import decrypt_limiter
+from usage import usage_tracker
+
+def call(app, *requests):
+    """Log in through the mounted Flask app, then send (method, url, kwargs) requests; returns the responses."""
+    asgi = create_asgi_app(app)
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi), base_url='http://test') as client:
+            await client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+            return [await client.request(method, url, **kwargs) for method, url, kwargs in requests]
+    try:
+        return asyncio.run(run())
+    finally:
+        asyncio.run(asgi.state.engine.dispose())
+
+@pytest.fixture
+def key_id(app, client):
+    return client.post('/add_key', data={'key_name': 'key', 'api_key': 'secret', 'category': 0}).get_json()['key']['id']
+
+def test_async_writes_open_the_read_your_writes_window(app, client):
+    app.config['REPLICA_DATABASE_URIS'] = [app.config['SQLALCHEMY_DATABASE_URI']]
+    from app import create_app
+    replicated = create_app(app.config)
+    added, listed = call(
+        replicated,
+        ('POST', '/add_key', {'data': {'key_name': 'new', 'api_key': 'secret', 'category': 0}}),
+        ('GET', '/get_categories_and_keys', {})
+    )
+    assert added.status_code == 200 and 'session=' in added.headers.get('set-cookie', '')
+    session = replicated.session_interface.get_signing_serializer(replicated).loads(
+        added.headers['set-cookie'].split('session=', 1)[1].split(';', 1)[0]
+    )
+    assert session['_primary_until'] > 0 and session['_user_id']
+    assert 'set-cookie' not in listed.headers
+
+def test_async_reveals_are_tracked_and_audited_like_wsgi_ones(app, client, key_id):
+    with app.app_context():
+        usage_tracker.configure(db.engine, interval=3600)
+        audit_log.configure(db.engine, flush_interval=0.05)
+    try:
+        recorded = usage_tracker.stats()['recorded']
+        response, = call(app, ('POST', f'/get_key/{key_id}', {}))
+        assert response.json() == {'key': 'secret'}
+        assert usage_tracker.stats()['recorded'] == recorded + 1
+        audit_log.shutdown()
+        with app.app_context():
+            assert [event.action for event in AuditEvent.query.filter_by(key_id=key_id)] == ['reveal']
+            usage_tracker.flush()
+            assert db.session.get(APIKey, key_id).reveal_count == 1
+    finally:
+        usage_tracker.enabled = False
+        audit_log.enabled = False
+
+def test_async_reveals_share_the_decrypt_limits(app, client, key_id):
+    decrypt_limiter.configure(MemoryBackend(), {'user': (0.01, 1)})
+    first, second = call(app, ('POST', f'/get_key/{key_id}', {}), ('POST', f'/copy_key/{key_id}', {}))
+    assert first.status_code == 200
+    assert second.status_code == 429 and second.headers['Retry-After']
+    # Same bucket as the WSGI routes
+    assert client.post(f'/get_key/{key_id}').status_code == 429
@@ -0,0 +1,47 @@
+import pytest
+from extensions import db
+from audit import audit_log
+
+@pytest.fixture
+def auditing(app):
+    with app.app_context():
+        audit_log.configure(db.engine, flush_interval=0.05)
+    yield audit_log
+    audit_log.shutdown()
+    audit_log.enabled = False
+
+@pytest.fixture
+def key_id(app, client):
+    return client.post('/add_key', data={'key_name': 'key', 'api_key': 'secret', 'category': 0}).get_json()['key']['id']
+
+def test_reveals_are_written_behind(client, auditing, key_id):
+    written = auditing.stats()['written']
+    client.post(f'/get_key/{key_id}')
+    auditing.shutdown()
+
+    events = client.get(f'/audit_events?key_id={key_id}').get_json()['events']
+    assert [event['action'] for event in events] == ['reveal', 'add']
+    stats = auditing.stats()
+    assert stats['written'] == written + 2 and stats['queued'] == 0 and stats['errors'] == 0
+
+def test_audit_events_page_by_cursor(client, user_id, auditing):
+    for _ in range(5):
+        auditing.record('export', user_id)
+    auditing.shutdown()
+
+    first = client.get('/audit_events?limit=3').get_json()
+    second = client.get(f"/audit_events?limit=3&cursor={first['next_cursor']}").get_json()
+    ids = [event['id'] for event in first['events'] + second['events']]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 5
+    assert second['next_cursor'] is None
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get('/audit_events?cursor=not-a-cursor').status_code == 400
+
+def test_writer_restarts_after_shutdown(client, user_id, auditing):
+    written = auditing.stats()['written']
+    auditing.record('export', user_id)
+    auditing.shutdown()
+    auditing.record('export', user_id)
+    auditing.shutdown()
+    assert auditing.stats()['written'] == written + 2
@@ -0,0 +1,57 @@
+import os
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert, text
+from audit import ensure_partitions, month_start
+from models import AuditEvent
+
+# Partitioning only exists on Postgres; point this at a throwaway database to run these
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL is not set')
+
+@pytest.fixture
+def connection():
+    engine = create_engine(POSTGRES_URL)
+    with engine.connect() as connection:
+        connection.execute(text('DROP TABLE IF EXISTS audit_event CASCADE'))
+        # Builds the partitioned table with only its default partition
+        AuditEvent.__table__.create(connection)
+        connection.commit()
+        yield connection
+        connection.rollback()
+        connection.execute(text('DROP TABLE IF EXISTS audit_event CASCADE'))
+        connection.commit()
+    engine.dispose()
+
+def partition_counts(connection):
+    return dict(connection.execute(text(
+        'SELECT tableoid::regclass::text, count(*) FROM audit_event GROUP BY 1'
+    )).all())
+
+def test_rows_stranded_in_default_move_into_the_new_partitions(connection):
+    now = datetime(2026, 10, 18)
+    connection.execute(insert(AuditEvent.__table__), [
+        {'occurred_at': now, 'user_id': 1, 'action': 'reveal'},
+        {'occurred_at': month_start(now, 1), 'user_id': 1, 'action': 'reveal'},
+        {'occurred_at': month_start(now, 6), 'user_id': 1, 'action': 'reveal'}
+    ])
+    connection.commit()
+
+    with connection.begin():
+        created = ensure_partitions(connection, months_ahead=2, now=now)
+
+    assert created == ['audit_event_2026_10', 'audit_event_2026_11', 'audit_event_2026_12']
+    assert partition_counts(connection) == {'audit_event_2026_10': 1, 'audit_event_2026_11': 1, 'audit_event_default': 1}
+
+def test_a_failing_month_does_not_stop_the_later_ones(connection):
+    now = datetime(2026, 10, 18)
+    # Overlaps October, so creating audit_event_2026_10 fails
+    connection.execute(text(
+        "CREATE TABLE audit_event_overlap PARTITION OF audit_event FOR VALUES FROM ('2026-10-15') TO ('2026-10-20')"
+    ))
+    connection.commit()
+
+    with connection.begin():
+        created = ensure_partitions(connection, months_ahead=1, now=now)
+
+    assert created == ['audit_event_2026_11']
@@ -0,0 +1,31 @@
+import pytest
+from backends import MemoryBackend, backend_from_url
+from fragments import backend_from_url as fragment_backend
+from rate_limit import backend_from_url as rate_limit_backend
+
+def test_token_bucket_allows_burst_then_reports_wait():
+    backend = MemoryBackend()
+    assert [backend.take('user:1', rate=1, burst=3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert backend.take('user:1', rate=1, burst=3) == pytest.approx(1.0, abs=0.05)
+    assert backend.take('user:2', rate=1, burst=3) == 0.0
+
+def test_dropped_bucket_starts_full():
+    backend = MemoryBackend(max_entries=1)
+    backend.take('user:1', rate=1, burst=1)
+    backend.take('user:2', rate=1, burst=1)
+    assert backend.take('user:1', rate=1, burst=1) == 0.0
+
+def test_byte_capped_store_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=10, max_bytes=10, sizeof=len)
+    backend.set('a', 'x' * 6)
+    backend.set('b', 'y' * 6)
+    assert backend.get('a') is None
+    assert backend.get('b') == 'y' * 6
+    assert backend.stats() == {'entries': 1, 'evictions': 1, 'bytes': 6, 'max_bytes': 10}
+
+def test_unsupported_urls_name_their_setting():
+    with pytest.raises(ValueError, match='FRAGMENT_CACHE_URL'):
+        fragment_backend('memcached://localhost', 10, 100, 60)
+    with pytest.raises(ValueError, match='RATE_LIMIT_STORAGE_URL'):
+        rate_limit_backend('memcached://localhost')
+    assert isinstance(backend_from_url('memory://', 'SETTING', 'prefix:'), MemoryBackend)
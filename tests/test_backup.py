@@ -0,0 +1,53 @@
+import io
+import json
+from datetime import datetime
+import pytest
+from conftest import PASSWORD
+from extensions import db
+from models import APIKey, Category, User
+
+PASSPHRASE = 'backup-passphrase'
+
+def restore(client, body, passphrase=PASSPHRASE):
+    return client.post('/restore_keys', data={'file': (io.BytesIO(body), 'backup.jsonl'), 'passphrase': passphrase})
+
+def test_round_trip_keeps_names_categories_and_dates(app, client, user_id):
+    client.post('/add_category', data={'name': 'Payments'})
+    with app.app_context():
+        category_id = Category.query.one().id
+    client.post('/add_key', data={'key_name': 'first', 'api_key': 'secret-1', 'category': category_id})
+    client.post('/add_key', data={'key_name': 'second', 'api_key': 'secret-2', 'category': 0})
+    with app.app_context():
+        APIKey.query.filter_by(key_name='first').one().date_added = datetime(2020, 5, 17, 8, 30)
+        db.session.commit()
+    backup = client.post('/export_keys', data={'passphrase': PASSPHRASE}).data
+
+    # Restored into another account, which has no categories yet
+    other = app.test_client()
+    other.post('/register', data={'email': 'other@example.com', 'password': PASSWORD, 'confirm_password': PASSWORD})
+    other.post('/login', data={'email': 'other@example.com', 'password': PASSWORD})
+    response = restore(other, backup)
+    assert response.get_json()['imported'] == 2
+    with app.app_context():
+        other_id = User.query.filter_by(email='other@example.com').one().id
+        categories = Category.query.filter_by(user_id=other_id).all()
+        assert [category.name for category in categories] == ['Payments']
+        keys = {key.key_name: key for key in APIKey.query.filter_by(user_id=other_id)}
+        assert keys['first'].category_id == categories[0].id
+        assert keys['second'].category_id is None
+        assert keys['first'].date_added == datetime(2020, 5, 17, 8, 30)
+        assert Category.query.filter_by(user_id=user_id).count() == 1
+        key_ids = {name: key.id for name, key in keys.items()}
+    assert other.post(f"/get_key/{key_ids['first']}").get_json() == {'key': 'secret-1'}
+    assert other.post(f"/get_key/{key_ids['second']}").get_json() == {'key': 'secret-2'}
+
+@pytest.mark.parametrize('header, error', [
+    ({'format': 'keyguardian-backup', 'version': 1, 'kdf': 'scrypt', 'check': 'x'}, 'missing its salt'),
+    ({'format': 'keyguardian-backup', 'version': 1, 'kdf': 'scrypt', 'salt': 'not base64!', 'check': 'x'}, 'invalid salt'),
+    ({'format': 'keyguardian-backup', 'version': 1, 'kdf': 'pbkdf2', 'salt': 'AAAA', 'check': 'x'}, 'key derivation'),
+    ({'format': 'keyguardian-backup', 'version': 1, 'kdf': 'scrypt', 'salt': 'AAAA', 'check': 7}, 'missing its salt'),
+])
+def test_malformed_header_is_a_400(client, header, error):
+    response = restore(client, json.dumps(header).encode() + b'\n')
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
@@ -0,0 +1,55 @@
+import pytest
+from extensions import db
+from models import APIKey
+from rotation import backfill_binary_keys
+from utils import FORMAT_FERNET, decrypt_key, encrypt_key, fernet_token, get_fernets, pack_token
+
+def test_packed_ciphertext_round_trips():
+    stored = encrypt_key('sk-live-ünïcode')
+    assert isinstance(stored, bytes) and stored[0] == FORMAT_FERNET
+    assert decrypt_key(stored) == 'sk-live-ünïcode'
+    # Raw bytes instead of base64 text: a quarter smaller than the legacy column
+    legacy = get_fernets()[0].encrypt(b'sk-live').decode()
+    assert len(pack_token(legacy)) < len(legacy)
+
+def test_legacy_text_tokens_still_decrypt():
+    legacy = get_fernets()[0].encrypt(b'sk-legacy').decode()
+    assert decrypt_key(legacy) == 'sk-legacy'
+    assert fernet_token(pack_token(legacy)) == legacy.encode()
+
+def test_unknown_format_byte_is_rejected():
+    with pytest.raises(ValueError, match='Unknown encrypted key format'):
+        decrypt_key(bytes([FORMAT_FERNET + 1]) + encrypt_key('x')[1:])
+
+@pytest.fixture
+def legacy_keys(app, user_id):
+    fernet = get_fernets()[0]
+    with app.app_context():
+        db.session.add_all(
+            APIKey(user_id=user_id, key_name=f'legacy {i}', encrypted_key=fernet.encrypt(f'secret {i}'.encode()).decode())
+            for i in range(5)
+        )
+        db.session.add(APIKey(user_id=user_id, key_name='packed', ciphertext=encrypt_key('packed secret')))
+        db.session.commit()
+        yield
+
+def test_backfill_converts_legacy_rows_and_is_idempotent(app, legacy_keys):
+    with app.app_context():
+        progress = []
+        assert backfill_binary_keys(chunk_size=2, progress=lambda last_key_id, converted: progress.append(converted)) == 5
+        assert progress == [2, 4, 5]
+        keys = APIKey.query.order_by(APIKey.id).all()
+        assert all(key.encrypted_key is None and key.ciphertext[0] == FORMAT_FERNET for key in keys)
+        assert [decrypt_key(key.ciphertext) for key in keys] == [f'secret {i}' for i in range(5)] + ['packed secret']
+        before = [key.ciphertext for key in keys]
+
+        assert backfill_binary_keys(chunk_size=2) == 0
+        db.session.expire_all()
+        assert [key.ciphertext for key in APIKey.query.order_by(APIKey.id)] == before
+
+def test_wallet_reveals_keys_in_either_format(app, client, legacy_keys):
+    with app.app_context():
+        legacy_id = APIKey.query.filter_by(key_name='legacy 0').one().id
+        packed_id = APIKey.query.filter_by(key_name='packed').one().id
+    assert client.post(f'/get_key/{legacy_id}').get_json() == {'key': 'secret 0'}
+    assert client.post(f'/get_key/{packed_id}').get_json() == {'key': 'packed secret'}
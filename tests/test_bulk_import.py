@@ -0,0 +1,38 @@
+import io
+import json
+from models import APIKey
+
+def post_jsonl(client, rows):
+    body = '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows).encode()
+    return client.post('/import_keys', data={'file': (io.BytesIO(body), 'keys.jsonl')})
+
+def test_non_string_fields_are_row_errors(app, client):
+    response = post_jsonl(client, [
+        {'key_name': 'good', 'api_key': 'secret'},
+        {'key_name': 'x', 'api_key': 123},
+        {'key_name': 5, 'api_key': 'secret'},
+        {'key_name': 'y', 'api_key': 'secret', 'category': ['a']},
+        {'key_name': 'also good', 'api_key': 'secret'}
+    ])
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['imported'] == 2
+    assert result['errors'] == [
+        {'line': 2, 'error': 'api_key must be a string.'},
+        {'line': 3, 'error': 'key_name must be a string.'},
+        {'line': 4, 'error': 'category must be a string.'}
+    ]
+
+def test_encryption_failure_is_reported_against_its_row(app, client):
+    # A lone surrogate parses as JSON but cannot be encoded to UTF-8 for encryption
+    response = post_jsonl(client, [
+        {'key_name': 'before', 'api_key': 'secret'},
+        '{"key_name": "broken", "api_key": "\\ud800"}',
+        {'key_name': 'after', 'api_key': 'secret'}
+    ])
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['imported'] == 2
+    assert result['errors'] == [{'line': 2, 'error': 'api_key could not be encrypted.'}]
+    with app.app_context():
+        assert sorted(name for name, in APIKey.query.with_entities(APIKey.key_name)) == ['after', 'before']
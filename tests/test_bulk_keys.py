@@ -0,0 +1,99 @@
+import pytest
+from extensions import db
+from models import User, APIKey, Category
+
+@pytest.fixture
+def wallet(app, user_id, seed_keys):
+    """Nine keys spread over Uncategorized and two categories, plus another user's category and key."""
+    category_ids = seed_keys(9, categories=2)
+    with app.app_context():
+        other = User(email='other@example.com', password_hash='x')
+        db.session.add(other)
+        db.session.flush()
+        other_category = Category(name='Theirs', user_id=other.id)
+        db.session.add(other_category)
+        db.session.flush()
+        other_key = APIKey(user_id=other.id, key_name='their key', ciphertext=b'', category_id=other_category.id)
+        db.session.add(other_key)
+        db.session.commit()
+        return category_ids, other_category.id, other_key.id
+
+def keys_by_category(app, user_id):
+    with app.app_context():
+        grouped = {}
+        for key_id, category_id in db.session.query(APIKey.id, APIKey.category_id).filter_by(user_id=user_id):
+            grouped.setdefault(category_id, []).append(key_id)
+        return grouped
+
+def test_delete_category_moves_its_keys_to_uncategorized(app, client, user_id, wallet):
+    (first, second), _, _ = wallet
+    before = keys_by_category(app, user_id)
+    response = client.post(f'/delete_category/{first}')
+    assert response.status_code == 302
+    after = keys_by_category(app, user_id)
+    assert first not in after
+    assert sorted(after[None]) == sorted(before[None] + before[first])
+    assert after[second] == before[second]
+    with app.app_context():
+        assert db.session.get(Category, first) is None
+
+def test_delete_category_can_delete_its_keys(app, client, user_id, wallet):
+    (first, _), _, _ = wallet
+    before = keys_by_category(app, user_id)
+    client.post(f'/delete_category/{first}', data={'keys': 'delete'})
+    after = keys_by_category(app, user_id)
+    assert first not in after
+    assert sum(map(len, after.values())) == sum(map(len, before.values())) - len(before[first])
+
+@pytest.mark.parametrize('keys', ['move', 'delete'])
+def test_delete_empty_category(app, client, user_id, keys):
+    with app.app_context():
+        category = Category(name='Empty', user_id=user_id)
+        db.session.add(category)
+        db.session.commit()
+        category_id = category.id
+    assert client.post(f'/delete_category/{category_id}', data={'keys': keys}).status_code == 302
+    with app.app_context():
+        assert db.session.get(Category, category_id) is None
+
+def test_delete_category_of_another_user_is_a_404(app, client, wallet):
+    _, other_category, other_key = wallet
+    assert client.post(f'/delete_category/{other_category}', data={'keys': 'delete'}).status_code == 404
+    with app.app_context():
+        assert db.session.get(Category, other_category) is not None
+        assert db.session.get(APIKey, other_key) is not None
+
+def test_move_keys_by_id_ignores_other_users_keys(app, client, user_id, wallet):
+    (first, _), other_category, other_key = wallet
+    uncategorized = keys_by_category(app, user_id)[None]
+    response = client.post('/move_keys', json={'key_ids': uncategorized + [other_key], 'category_id': first})
+    assert response.get_json() == {'success': True, 'moved': len(uncategorized), 'category_name': 'Category 0'}
+    assert None not in keys_by_category(app, user_id)
+    with app.app_context():
+        assert db.session.get(APIKey, other_key).category_id == other_category
+
+def test_move_keys_from_category_to_uncategorized(app, client, user_id, wallet):
+    (first, _), _, _ = wallet
+    before = keys_by_category(app, user_id)
+    response = client.post('/move_keys', json={'from_category_id': first, 'category_id': 0})
+    assert response.get_json()['moved'] == len(before[first])
+    assert first not in keys_by_category(app, user_id)
+
+def test_move_keys_into_another_users_category_is_a_404(client, wallet):
+    _, other_category, _ = wallet
+    assert client.post('/move_keys', json={'from_category_id': 0, 'category_id': other_category}).status_code == 404
+
+def test_delete_keys_by_category_and_by_id(app, client, user_id, wallet):
+    (_, second), other_category, other_key = wallet
+    before = keys_by_category(app, user_id)
+    assert client.post('/delete_keys', json={'category_id': 0}).get_json()['deleted'] == len(before[None])
+    assert client.post('/delete_keys', json={'key_ids': before[second][:1] + [other_key]}).get_json()['deleted'] == 1
+    after = keys_by_category(app, user_id)
+    assert None not in after and len(after[second]) == len(before[second]) - 1
+    with app.app_context():
+        key = db.session.get(APIKey, other_key)
+        assert key is not None and key.key_name == 'their key' and key.category_id == other_category
+
+@pytest.mark.parametrize('body', [{}, {'key_ids': 'all'}, {'key_ids': [1, 'x']}, {'category_id': '1'}, {'key_ids': list(range(1001))}])
+def test_delete_keys_rejects_bad_selections(client, body):
+    assert client.post('/delete_keys', json=body).status_code == 400
@@ -0,0 +1,28 @@
+from fragments import wallet_fragments
+
+def test_wallet_body_is_served_from_cache_until_the_wallet_changes(client):
+    client.post('/add_key', data={'key_name': 'first key', 'api_key': 'secret', 'category': 0})
+    assert b'first key' in client.get('/wallet').data
+    client.get('/wallet')
+    assert wallet_fragments.stats()['hits'] == 1
+
+    client.post('/add_key', data={'key_name': 'second key', 'api_key': 'secret', 'category': 0})
+    body = client.get('/wallet').data
+    assert b'first key' in body and b'second key' in body
+    assert wallet_fragments.stats()['misses'] == 2
+
+def test_category_changes_invalidate_the_cached_body(client):
+    client.post('/add_category', data={'name': 'Payments'})
+    assert b'Payments' in client.get('/wallet').data
+    category_id = client.get('/get_categories_and_keys').get_json()['categories'][0]['id']
+    client.post(f'/edit_category/{category_id}', data={'name': 'Billing'})
+    body = client.get('/wallet').data
+    assert b'Billing' in body and b'Payments' not in body
+
+def test_bodies_are_cached_per_user(app, client):
+    client.post('/add_key', data={'key_name': 'private key', 'api_key': 'secret', 'category': 0})
+    client.get('/wallet')
+    other = app.test_client()
+    other.post('/register', data={'email': 'other@example.com', 'password': 'other-password', 'confirm_password': 'other-password'})
+    other.post('/login', data={'email': 'other@example.com', 'password': 'other-password'})
+    assert b'private key' not in other.get('/wallet').data
@@ -0,0 +1,26 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from hashing import PasswordHasher, method_prefix
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:32768:8:1', 'pbkdf2:sha256:1000'])
+def test_hash_made_with_configured_method_needs_no_rehash(method):
+    hasher = PasswordHasher(method=method)
+    assert not hasher.needs_rehash(hasher.hash('password'))
+
+def test_hash_with_other_parameters_needs_rehash():
+    hasher = PasswordHasher(method='scrypt')
+    assert hasher.needs_rehash(generate_password_hash('password', 'pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('password', 'scrypt:16384:8:1'))
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512', 'pbkdf2:sha256:1000'])
+def test_method_prefix_matches_werkzeug_without_hashing(method):
+    assert method_prefix(method) == generate_password_hash('password', method).split('$', 1)[0]
+
+def test_needs_rehash_never_hashes(monkeypatch):
+    hasher = PasswordHasher(method='scrypt')
+    monkeypatch.setattr('hashing.generate_password_hash', lambda *args: pytest.fail('hashed on the request thread'))
+    assert not hasher.needs_rehash(generate_password_hash('password', 'scrypt:32768:8:1'))
+
+def test_invalid_method_fails_at_configure():
+    with pytest.raises(ValueError, match='Invalid hash method'):
+        PasswordHasher(method='md5')
@@ -0,0 +1,33 @@
+import logging
+import queue
+from logging_setup import DroppingQueueHandler, LOG_FORMAT
+
+def queued_logger(log_queue):
+    handler = DroppingQueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger = logging.Logger('test.logging_setup')
+    logger.addHandler(handler)
+    return logger, handler
+
+def test_records_are_formatted_before_they_are_queued():
+    log_queue = queue.Queue()
+    logger, _ = queued_logger(log_queue)
+    state = ['before']
+    logger.warning('state is %s', state)
+    state[0] = 'after'
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('failed')
+
+    first, second = log_queue.get_nowait(), log_queue.get_nowait()
+    assert first.getMessage().endswith("WARNING test.logging_setup: state is ['before']")
+    assert first.args is None
+    assert 'ERROR test.logging_setup: failed' in second.getMessage()
+    assert 'ValueError: boom' in second.getMessage() and second.exc_info is None
+
+def test_full_queue_drops_records():
+    logger, handler = queued_logger(queue.Queue(maxsize=1))
+    logger.warning('kept')
+    logger.warning('dropped')
+    assert handler.dropped == 1
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import select, tuple_
+from extensions import db
+from models import Category
+from queries import first_pages_select, sort_columns, wallet_keys_select
+
+def query_plan(statement):
+    """SQLite's EXPLAIN QUERY PLAN detail lines for a statement."""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, params).all()
+    return [row[-1] for row in rows]
+
+@pytest.fixture
+def wallet(app, user_id, seed_keys):
+    category_ids = seed_keys(200)
+    with app.app_context():
+        yield user_id, category_ids[0]
+
+def test_all_keys_view_reads_the_name_index_in_order(wallet):
+    user_id, _ = wallet
+    plan = query_plan(wallet_keys_select(user_id))
+    assert 'SEARCH api_key USING INDEX ix_api_key_user_lower_name (user_id=?)' in plan
+    assert not any('TEMP B-TREE' in line for line in plan)
+
+def test_category_view_reads_the_category_index_in_order(wallet):
+    user_id, category_id = wallet
+    plan = query_plan(wallet_keys_select(user_id, category_id))
+    assert 'SEARCH api_key USING INDEX ix_api_key_user_category_lower_name (user_id=? AND category_id=?)' in plan
+    assert not any('TEMP B-TREE' in line for line in plan)
+
+def test_keyset_page_reads_the_category_index_in_order(wallet):
+    user_id, category_id = wallet
+    # Same predicate next_page adds after a cursor
+    columns, _ = sort_columns('name')
+    after = tuple_(*columns) > tuple_('key 0010', 10)
+    plan = query_plan(wallet_keys_select(user_id, category_id).where(after).limit(21))
+    assert 'SEARCH api_key USING INDEX ix_api_key_user_category_lower_name (user_id=? AND category_id=?)' in plan
+    assert not any('TEMP B-TREE' in line for line in plan)
+
+def test_first_pages_rank_keys_from_the_category_index(wallet):
+    user_id, _ = wallet
+    plan = query_plan(first_pages_select(user_id, 20))
+    assert 'SEARCH api_key USING INDEX ix_api_key_user_category_lower_name (user_id=?)' in plan
+
+def test_category_list_is_covered_by_its_index(wallet):
+    user_id, _ = wallet
+    plan = query_plan(select(Category).filter_by(user_id=user_id).order_by(Category.name))
+    assert plan == ['SEARCH category USING COVERING INDEX ix_category_user_name (user_id=?)']
@@ -0,0 +1,113 @@
+import shutil
+import time
+import pytest
+from sqlalchemy import create_engine, event, text
+from conftest import PASSWORD
+
+def make_app(primary_path, *replica_urls):
+    from app import create_app
+    from user_cache import user_cache
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary_path}',
+        'REPLICA_DATABASE_URIS': list(replica_urls),
+        'WTF_CSRF_ENABLED': False,
+        'RATE_LIMIT_ENABLED': False,
+        'USAGE_TRACKING_ENABLED': False,
+        'AUDIT_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'
+    })
+    user_cache.clear()
+    return app
+
+def key_names(client):
+    response = client.get('/get_categories_and_keys')
+    assert response.status_code == 200
+    return sorted(key['key_name'] for keys in response.get_json()['grouped_keys'].values() for key in keys)
+
+@pytest.fixture
+def databases(app, client, tmp_path):
+    """A primary with one key, and a replica copied from it whose copy of the key is renamed."""
+    from extensions import db
+    client.post('/add_key', data={'key_name': 'key', 'api_key': 'secret', 'category': 0})
+    primary = tmp_path / 'app.db'
+    replica = tmp_path / 'replica.db'
+    with app.app_context():
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+    engine = create_engine(f'sqlite:///{replica}')
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE api_key SET key_name = 'key on replica'"))
+    engine.dispose()
+    return primary, replica
+
+@pytest.fixture
+def replica_client(databases):
+    primary, replica = databases
+    app = make_app(primary, f'sqlite:///{replica}')
+    client = app.test_client()
+    client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+    # Logging in wrote to the primary; start outside the read-your-writes window
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+    return app, client
+
+def test_read_only_endpoint_reads_from_the_replica(replica_client):
+    app, client = replica_client
+    assert key_names(client) == ['key on replica']
+    stats = app.extensions['replicas'].stats()
+    assert stats['replica_0_reads'] > 0 and stats['fallbacks'] == 0
+
+def test_writes_go_to_the_primary_and_pin_reads_there(replica_client, databases):
+    app, client = replica_client
+    primary, replica = databases
+    response = client.post('/add_key', data={'key_name': 'added', 'api_key': 'secret', 'category': 0})
+    assert response.status_code == 200
+    with create_engine(f'sqlite:///{primary}').connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM api_key WHERE key_name = 'added'")).scalar() == 1
+    with create_engine(f'sqlite:///{replica}').connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM api_key WHERE key_name = 'added'")).scalar() == 0
+
+    # Inside the sticky window the user reads their own write from the primary
+    with client.session_transaction() as session:
+        assert session['_primary_until'] > time.time()
+    assert key_names(client) == ['added', 'key']
+    assert app.extensions['replicas'].stats()['sticky_reads'] > 0
+
+    with client.session_transaction() as session:
+        session['_primary_until'] = time.time() - 1
+    assert key_names(client) == ['key on replica']
+
+def test_each_request_reads_from_a_single_replica(databases, tmp_path):
+    primary, replica = databases
+    second = tmp_path / 'replica_1.db'
+    shutil.copy(replica, second)
+    app = make_app(primary, f'sqlite:///{replica}', f'sqlite:///{second}')
+    statements = []
+    for member in app.extensions['replicas'].replicas:
+        event.listen(member.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args, name=member.name: statements.append((name, statement)))
+    client = app.test_client()
+    client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+
+    used = set()
+    for _ in range(4):
+        with client.session_transaction() as session:
+            session['_primary_until'] = 0
+        statements.clear()
+        key_names(client)
+        # Health checks run their own SELECT 1 on every replica
+        names = {name for name, statement in statements if statement != 'SELECT 1'}
+        assert len(names) == 1
+        used |= names
+    assert used == {'replica_0', 'replica_1'}
+
+def test_unreachable_replica_falls_back_to_the_primary(databases, tmp_path):
+    primary, _ = databases
+    app = make_app(primary, f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    client = app.test_client()
+    client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+    with client.session_transaction() as session:
+        session['_primary_until'] = 0
+    assert key_names(client) == ['key']
+    stats = app.extensions['replicas'].stats()
+    assert stats['replica_0_healthy'] == 0 and stats['fallbacks'] > 0
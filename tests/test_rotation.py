@@ -0,0 +1,52 @@
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine, event, select, update
+import utils
+from extensions import db
+from models import APIKey
+from rotation import rotate_all_keys
+from utils import fernet_token, get_fernets, pack_token
+
+@pytest.fixture
+def old_key_rows(app, user_id, monkeypatch):
+    """Five legacy text rows encrypted under a key that is being retired."""
+    old_key = Fernet.generate_key().decode()
+    monkeypatch.setenv('OLD_ENCRYPTION_KEYS', old_key)
+    monkeypatch.setattr(utils, '_fernets', None)
+    with app.app_context():
+        db.session.add_all(
+            APIKey(user_id=user_id, key_name=f'key {i}', encrypted_key=Fernet(old_key).encrypt(f'secret {i}'.encode()).decode())
+            for i in range(5)
+        )
+        db.session.commit()
+
+def backfill_in_another_process(url):
+    engine = create_engine(url)
+    table = APIKey.__table__
+    with engine.begin() as connection:
+        for key_id, encrypted_key in connection.execute(select(table.c.id, table.c.encrypted_key).where(table.c.encrypted_key.isnot(None))):
+            connection.execute(update(table).where(table.c.id == key_id).values(ciphertext=pack_token(encrypted_key), encrypted_key=None))
+    engine.dispose()
+
+def test_rotation_re_rotates_rows_the_backfill_packed_under_it(app, old_key_rows):
+    with app.app_context():
+        interleaved = []
+        def backfill_before_first_write(conn, cursor, statement, *args):
+            if statement.startswith('UPDATE api_key') and not interleaved:
+                interleaved.append(True)
+                backfill_in_another_process(app.config['SQLALCHEMY_DATABASE_URI'])
+        event.listen(db.engine, 'before_cursor_execute', backfill_before_first_write)
+        try:
+            job = rotate_all_keys(chunk_size=10, workers=1)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', backfill_before_first_write)
+
+        assert interleaved and job.rotated_count == 5
+        primary = get_fernets()[0]
+        keys = APIKey.query.order_by(APIKey.id).all()
+        assert [primary.decrypt(fernet_token(key.ciphertext)).decode() for key in keys] == [f'secret {i}' for i in range(5)]
+
+def test_rotation_counts_only_rows_it_rewrote(app, old_key_rows):
+    with app.app_context():
+        assert rotate_all_keys(chunk_size=2, workers=1).rotated_count == 5
+        assert rotate_all_keys(chunk_size=2, workers=1, restart=True).rotated_count == 0
@@ -0,0 +1,45 @@
+import pytest
+from extensions import db
+from models import APIKey, Category
+from search import search_database, search_memory
+
+NAMES = ['Stripe live', 'Stripe', 'GitHub token', 'Old stripe backup', 'AWS 100%_key', 'AWS 100 key']
+
+@pytest.fixture
+def wallet(app, user_id):
+    with app.app_context():
+        payments = Category(name='Payments', user_id=user_id)
+        db.session.add(payments)
+        db.session.flush()
+        db.session.add_all(APIKey(user_id=user_id, key_name=name, ciphertext=b'', category_id=payments.id if 'tripe' in name else None) for name in NAMES)
+        db.session.add(Category(name='Stripe archive', user_id=user_id))
+        db.session.commit()
+    return user_id
+
+def search(client, term, limit=20):
+    response = client.get('/search', query_string={'q': term, 'limit': limit})
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_prefix_matches_rank_first_then_shorter_names(client, wallet):
+    result = search(client, 'STRIPE')
+    assert [key['key_name'] for key in result['keys']] == ['Stripe', 'Stripe live', 'Old stripe backup']
+    assert result['keys'][0]['category_name'] == 'Payments'
+    assert [category['name'] for category in result['categories']] == ['Stripe archive']
+
+def test_like_wildcards_are_matched_literally(client, wallet):
+    assert [key['key_name'] for key in search(client, '100%_')['keys']] == ['AWS 100%_key']
+
+def test_limit_and_blank_terms(client, wallet):
+    assert len(search(client, 'e', limit=2)['keys']) == 2
+    assert search(client, '   ') == {'keys': [], 'categories': []}
+
+@pytest.mark.parametrize('term', ['stripe', 'aws', 'key', 'e', '100%', 'zzz'])
+def test_memory_index_matches_sql_ranking(app, wallet, term):
+    with app.app_context():
+        assert search_memory(wallet, term, 3) == search_database(wallet, term, 3)
+
+def test_index_is_rebuilt_after_a_wallet_change(client, wallet):
+    assert search(client, 'new key')['keys'] == []
+    client.post('/add_key', data={'key_name': 'New key', 'api_key': 'secret', 'category': 0})
+    assert [key['key_name'] for key in search(client, 'new key')['keys']] == ['New key']
@@ -0,0 +1,35 @@
+from conftest import PASSWORD
+from extensions import db
+from hashing import password_hasher
+from models import User
+from user_cache import user_cache
+
+def logged_in(client):
+    return client.get('/manage_categories').status_code == 200
+
+def login(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'user@example.com', 'password': PASSWORD})
+    return client
+
+def test_rehash_on_login_keeps_other_sessions(app, client, user_id):
+    password_hasher.configure(2, 8, 'pbkdf2:sha256:2000')
+    other = login(app)
+    with app.app_context():
+        assert db.session.get(User, user_id).password_hash.startswith('pbkdf2:sha256:2000$')
+    assert logged_in(client) and logged_in(other)
+
+def test_logout_everywhere_ends_every_session(app, client):
+    other = login(app)
+    assert logged_in(other)
+    other.post('/logout_everywhere')
+    assert not logged_in(client) and not logged_in(other)
+    assert logged_in(login(app))
+
+def test_stale_cached_user_is_rejected_after_a_revoke(app, client, user_id):
+    assert logged_in(client)
+    # Another process still holds the copy it cached before the revoke
+    stale = user_cache.get(user_id)
+    login(app).post('/logout_everywhere')
+    user_cache.set(user_id, stale)
+    assert not logged_in(client)
@@ -0,0 +1,50 @@
+import pytest
+from extensions import db
+from fragments import wallet_fragments
+from models import APIKey
+from usage import usage_tracker
+
+@pytest.fixture
+def tracking(app):
+    with app.app_context():
+        usage_tracker.configure(db.engine, interval=3600)
+    yield usage_tracker
+    usage_tracker.flush()
+    usage_tracker.enabled = False
+
+@pytest.fixture
+def key_id(app, client):
+    return client.post('/add_key', data={'key_name': 'key', 'api_key': 'secret', 'category': 0}).get_json()['key']['id']
+
+def test_flush_writes_counts_and_last_access(app, client, tracking, key_id):
+    client.post(f'/get_key/{key_id}')
+    client.post(f'/copy_key/{key_id}')
+    assert tracking.flush() == 1
+    with app.app_context():
+        key = db.session.get(APIKey, key_id)
+        assert key.reveal_count == 2 and key.last_accessed is not None
+
+def test_reveals_keep_name_sorted_views_cached(client, tracking, key_id):
+    etag = client.get('/get_categories_and_keys').headers['ETag']
+    client.get('/wallet')
+    client.post(f'/get_key/{key_id}')
+    tracking.flush()
+
+    assert client.get('/get_categories_and_keys', headers={'If-None-Match': etag}).status_code == 304
+    hits = wallet_fragments.stats()['hits']
+    client.get('/wallet')
+    assert wallet_fragments.stats()['hits'] == hits + 1
+    keys = client.get('/get_categories_and_keys').get_json()['grouped_keys']['Uncategorized']
+    assert 'reveal_count' not in keys[0]
+
+def test_last_used_views_follow_usage_flushes(client, tracking, key_id):
+    response = client.get('/get_categories_and_keys?sort=last_used')
+    assert response.get_json()['grouped_keys']['Uncategorized'][0]['reveal_count'] == 0
+    assert b'Never used' in client.get('/wallet?sort=last_used').data
+    client.post(f'/get_key/{key_id}')
+    tracking.flush()
+
+    refreshed = client.get('/get_categories_and_keys?sort=last_used', headers={'If-None-Match': response.headers['ETag']})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()['grouped_keys']['Uncategorized'][0]['reveal_count'] == 1
+    assert b'(1 reveal)' in client.get('/wallet?sort=last_used').data
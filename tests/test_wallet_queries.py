@@ -0,0 +1,29 @@
+import pytest
+
+# Page size is per category: 500 keys over four groups fills every first page and leaves more
+SIZES = [1, 40, 500]
+
+@pytest.mark.parametrize('size', SIZES)
+@pytest.mark.parametrize('url', ['/wallet', '/get_categories_and_keys'])
+def test_wallet_query_count_is_fixed(app, client, seed_keys, count_queries, url, size):
+    seed_keys(size)
+    # Warms the user_loader cache so only the route's own statements are counted
+    client.get('/manage_categories')
+    with count_queries() as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    # wallet_version, categories, and the first page of keys with their categories joined in
+    assert queries.count == 3, queries.statements
+    if url == '/get_categories_and_keys':
+        data = response.get_json()
+        page_size = app.config.get('WALLET_PAGE_SIZE', 50)
+        assert max(len(keys) for keys in data['grouped_keys'].values()) == min(page_size, -(-size // 4))
+        assert bool(data['next_cursors']) == (size > 4 * page_size)
+
+def test_cached_wallet_costs_one_query(client, seed_keys, count_queries):
+    seed_keys(10)
+    client.get('/wallet')
+    with count_queries() as queries:
+        response = client.get('/wallet')
+    assert response.status_code == 200
+    assert queries.count == 1, queries.statements
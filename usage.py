@@ -0,0 +1,124 @@
+import logging
+import threading
+from datetime import datetime
+from sqlalchemy import bindparam, case, or_, update
+from background import BackgroundThread
+from models import User, APIKey
+
+logger = logging.getLogger(__name__)
+
+class UsageTracker:
+    """Reveal counts and last-access times, buffered in memory and written behind.
+
+    record() only touches a dict, so reveals add no writes of their own. A
+    background thread flushes the buffer every interval seconds as one
+    batched UPDATE, plus one usage_version bump for the users involved so
+    the last_used views pick the new figures up. wallet_version is left
+    alone, so a reveal does not invalidate the other cached wallet views. The buffer holds at most
+    max_pending keys; events for further keys are dropped and counted.
+    Whatever is pending is flushed at exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flusher = BackgroundThread(self._run, 'usage-flush')
+        self.engine = None
+        self.enabled = False
+        self.interval = 30
+        self.max_pending = 10000
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.flushed_keys = 0
+        self.errors = 0
+
+    def configure(self, engine, interval=30, max_pending=10000, enabled=True):
+        self.engine = engine
+        self.interval = interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+        if enabled:
+            self._flusher.at_exit(self.shutdown)
+
+    def _run(self):
+        while not self._flusher.stopping.wait(self.interval):
+            self.flush()
+
+    def _merge(self, user_id, key_id, count, accessed):
+        # Caller holds the lock
+        entry = self._pending.get(key_id)
+        if entry is None:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += count
+                return
+            self._pending[key_id] = [user_id, count, accessed]
+        else:
+            entry[1] += count
+            entry[2] = max(entry[2], accessed)
+
+    def record(self, user_id, key_ids):
+        """Note that user_id just revealed key_ids."""
+        if not self.enabled or not key_ids:
+            return
+        self._flusher.start()
+        now = datetime.utcnow()
+        with self._lock:
+            for key_id in key_ids:
+                self._merge(user_id, key_id, 1, now)
+            self.recorded += len(key_ids)
+
+    def flush(self):
+        """Write everything pending; returns how many keys were updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.engine is None:
+            return 0
+        table = APIKey.__table__
+        accessed = bindparam('accessed', type_=table.c.last_accessed.type)
+        statement = update(table).where(table.c.id == bindparam('key_id')).values(
+            reveal_count=table.c.reveal_count + bindparam('count'),
+            last_accessed=case((or_(table.c.last_accessed.is_(None), table.c.last_accessed < accessed), accessed), else_=table.c.last_accessed)
+        )
+        user_ids = {user_id for user_id, _, _ in pending.values()}
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(statement, [
+                    {'key_id': key_id, 'count': count, 'accessed': accessed_at}
+                    for key_id, (_, count, accessed_at) in pending.items()
+                ])
+                connection.execute(
+                    update(User.__table__).where(User.__table__.c.id.in_(user_ids))
+                    .values(usage_version=User.__table__.c.usage_version + 1)
+                )
+        except Exception as e:
+            logger.warning("Usage flush of %s keys failed; keeping them for the next one: %s", len(pending), e)
+            with self._lock:
+                self.errors += 1
+                for key_id, (user_id, count, accessed_at) in pending.items():
+                    self._merge(user_id, key_id, count, accessed_at)
+            return 0
+        with self._lock:
+            self.flushes += 1
+            self.flushed_keys += len(pending)
+        return len(pending)
+
+    def shutdown(self):
+        # Let a flush already in progress finish before writing what is left
+        self._flusher.stop(5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'max_pending': self.max_pending,
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'flushes': self.flushes,
+                'flushed_keys': self.flushed_keys,
+                'errors': self.errors
+            }
+
+usage_tracker = UsageTracker()
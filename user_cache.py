@@ -0,0 +1,80 @@
+import logging
+from flask import session
+from extensions import db
+from backends import backend_from_url
+from cache import TTLCache
+from models import User
+
+logger = logging.getLogger(__name__)
+
+user_cache = TTLCache()
+
+class CredentialVersions:
+    """Latest User.credentials_version per user, published when sessions are revoked.
+
+    Other processes compare their cached users against it, so a revoke
+    takes effect everywhere at once instead of when each cached copy
+    expires. Only Redis is shared between processes; with the memory
+    backend the other processes catch up within USER_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self.backend = backend_from_url(None, 'USER_CACHE_URL', 'credentials:')
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def publish(self, user_id, version):
+        try:
+            self.backend.set(str(user_id), str(version))
+        except Exception as e:
+            logger.warning("Publishing credentials version for user %s failed: %s", user_id, e)
+
+    def is_current(self, user):
+        # A backend failure counts as stale so the caller rereads the user
+        try:
+            published = self.backend.get(str(user.id))
+        except Exception as e:
+            logger.warning("Reading credentials version for user %s failed: %s", user.id, e)
+            return False
+        return published is None or int(published) == user.credentials_version
+
+credential_versions = CredentialVersions()
+
+def auth_stamp(user):
+    # Only a password change or logout everywhere bumps it; rehashing on login does not
+    return user.credentials_version
+
+def remember_login(user):
+    session['_auth_stamp'] = auth_stamp(user)
+
+def revoke_sessions(user):
+    """Log user out of every session, in every process; commits."""
+    user.credentials_version = User.credentials_version + 1
+    db.session.commit()
+    user_cache.invalidate(user.id)
+    credential_versions.publish(user.id, user.credentials_version)
+
+def load_cached_user(user_id):
+    """Return the user for a session, avoiding the SELECT while a fresh cached copy exists.
+
+    Cached users are detached snapshots; each request gets its own copy
+    merged into the current session without touching the database.
+    """
+    stamp = session.get('_auth_stamp')
+    cached = user_cache.get(user_id)
+    if cached is not None and stamp is not None and auth_stamp(cached) == stamp and credential_versions.is_current(cached):
+        return db.session.merge(cached, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    current_stamp = auth_stamp(user)
+    if stamp is None:
+        session['_auth_stamp'] = current_stamp
+    elif stamp != current_stamp:
+        # Session predates a password change or a logout everywhere
+        return None
+    db.session.expunge(user)
+    user_cache.set(user_id, user)
+    return db.session.merge(user, load=False)
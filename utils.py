@@ -1,32 +1,89 @@
+import base64
 import os
-from cryptography.fernet import Fernet, InvalidToken
+import time
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
-ENCRYPTION_KEY = os.environ['ENCRYPTION_KEY']
-if not ENCRYPTION_KEY:
-    raise ValueError("ENCRYPTION_KEY environment variable is not set")
+_fernets = None
 
-fernet = Fernet(ENCRYPTION_KEY)
+def get_fernets():
+    """Return (primary Fernet, MultiFernet), built from the environment on first use."""
+    global _fernets
+    if _fernets is None:
+        encryption_key = os.environ.get('ENCRYPTION_KEY')
+        if not encryption_key:
+            raise ValueError("ENCRYPTION_KEY environment variable is not set")
+        # Retired keys stay available for decryption until the rotation job has re-encrypted every row
+        old_keys = [key.strip() for key in os.environ.get('OLD_ENCRYPTION_KEYS', '').split(',') if key.strip()]
+        primary = Fernet(encryption_key)
+        _fernets = (primary, MultiFernet([primary] + [Fernet(key) for key in old_keys]))
+    return _fernets
+
+# Callbacks receiving (operation, seconds) for each encrypt/decrypt; used by metrics
+timing_observers = []
+
+def _observe(operation, start):
+    elapsed = time.perf_counter() - start
+    for observer in timing_observers:
+        observer(operation, elapsed)
+
+# First byte of every api_key.ciphertext value; bump it to change the stored layout
+FORMAT_FERNET = 1
+
+def pack_token(token):
+    """Stored form of a Fernet token: the format byte followed by the token's raw bytes."""
+    return bytes([FORMAT_FERNET]) + base64.urlsafe_b64decode(token)
+
+def fernet_token(stored):
+    """Fernet token for a stored key: packed bytes from ciphertext or a legacy base64 string.
+
+    Fernet only accepts base64 tokens, so packed ones are re-encoded here
+    rather than reimplementing its HMAC and AES steps on the raw bytes.
+    """
+    if isinstance(stored, str):
+        return stored.encode()
+    if stored[0] != FORMAT_FERNET:
+        raise ValueError(f'Unknown encrypted key format {stored[0]}')
+    return base64.urlsafe_b64encode(stored[1:])
 
 def encrypt_key(api_key):
-    return fernet.encrypt(api_key.encode()).decode()
+    """Encrypt under the primary key and return the packed form stored in api_key.ciphertext."""
+    start = time.perf_counter()
+    try:
+        return pack_token(get_fernets()[1].encrypt(api_key.encode()))
+    finally:
+        if timing_observers:
+            _observe('encrypt', start)
 
-def decrypt_key(encrypted_key):
+def decrypt_key(stored):
+    start = time.perf_counter()
     try:
-        if isinstance(encrypted_key, str):
-            encrypted_key = encrypted_key.encode()
-        elif isinstance(encrypted_key, memoryview):
-            encrypted_key = encrypted_key.tobytes()
-        logging.debug(f'Encrypted key type: {type(encrypted_key)}')
-        logging.debug(f'Encrypted key: {encrypted_key}')
-        decrypted_key = fernet.decrypt(encrypted_key)
-        logging.debug(f'Decrypted key type: {type(decrypted_key)}')
-        return decrypted_key.decode()
-    except InvalidToken as e:
-        logging.error(f'Invalid token error: {str(e)}')
+        return get_fernets()[1].decrypt(fernet_token(stored)).decode()
+    except InvalidToken:
+        logger.error('Invalid token error while decrypting key')
         raise
     except Exception as e:
-        logging.error(f'Decryption error: {str(e)}')
+        logger.error('Decryption error: %s', e)
         raise
+    finally:
+        if timing_observers:
+            _observe('decrypt', start)
+
+def rotate_tokens(stored_keys):
+    """Re-encrypt stored keys under the primary key.
+
+    Returns one entry per key: the new packed ciphertext, or None if the
+    key is already encrypted with the primary key. Runs in rotation worker processes.
+    """
+    primary_fernet, fernet = get_fernets()
+    rotated = []
+    for stored in stored_keys:
+        token = fernet_token(stored)
+        try:
+            primary_fernet.decrypt(token)
+            rotated.append(None)
+        except InvalidToken:
+            rotated.append(pack_token(fernet.rotate(token)))
+    return rotated